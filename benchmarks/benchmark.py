@@ -0,0 +1,616 @@
+"""
+CPU benchmarks of the code that runs every timestep: the custom updaters
+(WTmetadUpdater, MetaAlchemUpdater, AlchemUpdater, TypeUpdater,
+HarmonicUpdater), the order parameters compute_num_liq and compute_qc and
+the metadynamics biases.
+
+Every group runs in its own process with the example directory it tests on
+sys.path, since the examples share module names (bias, checkpoint,
+harmonic, ...). Groups that need a package which is not installed, e.g.
+hoomd, are recorded as skipped. Inputs are built from fixed seeds and BLAS,
+OpenMP and freud run on one thread, so results of two runs on the same
+machine are comparable.
+
+Two kinds of results are written:
+
+- per call: the latency of one act() or order parameter call, and the peak
+  Python/numpy memory allocated during one call (tracemalloc, not hoomd's
+  C++ buffers), as N, the number of deposited hills and the shape options
+  grow. retained_bytes is the memory held after setup, e.g. by the hills.
+- per step: the wall time of sim.run per step with the updater attached with
+  trigger period p, next to the same run without it (the bare HPMC sweep),
+  as overhead = time - bare and relative = time/bare.
+
+    python benchmarks/benchmark.py --output baseline.json
+    python benchmarks/benchmark.py --output new.json --compare baseline.json
+
+With --compare, cases whose median time grew by more than --tolerance are
+listed and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import importlib.metadata
+import platform
+import itertools
+import subprocess
+import tracemalloc
+import multiprocessing
+
+# one thread everywhere, set before numpy is imported in the workers
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GROUPS = {}
+
+
+def group(name, directory):
+    """
+    Register a benchmark group run with directory (relative to the
+    repository root) on sys.path. The decorated function takes the config
+    dict and yields cases, see _run_group.
+    """
+    def decorate(fn):
+        GROUPS[name] = (directory, fn)
+        return fn
+    return decorate
+
+
+def stats(times):
+
+    times = np.asarray(times, dtype=np.float64)
+    return {'min': float(times.min()), 'median': float(np.median(times)),
+            'mean': float(times.mean()), 'stdev': float(times.std())}
+
+
+def traced(fn):
+    """
+    Call fn under tracemalloc. Returns its result, the bytes still allocated
+    afterwards and the peak bytes allocated during the call.
+    """
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+
+def time_calls(fn, number, repeat, warmup=1):
+    """
+    Seconds per call of fn, one value per repeat of number calls
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter()-start)/number)
+    return times
+
+
+def time_steps(sim, steps, repeat):
+    """
+    Seconds per timestep of sim.run(steps), one value per repeat
+    """
+    sim.run(steps)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sim.run(steps)
+        times.append((time.perf_counter()-start)/steps)
+    return times
+
+
+def lattice(N, spacing, rng=None, jitter=0.):
+    """
+    First N sites of a simple cubic lattice centered in a cubic box, with
+    optional uniform jitter. Returns positions and the box length.
+    """
+    n = int(np.ceil(N**(1/3)-1e-9))
+    L = n*spacing
+    idx = np.array(list(itertools.product(range(n), repeat=3))[:N], dtype=np.float64)
+    pos = (idx+0.5)*spacing-L/2
+    if jitter:
+        pos += rng.uniform(-jitter, jitter, pos.shape)
+    return pos, L
+
+
+def per_step(name, params, sim, updater, steps, repeat, bare):
+    """
+    Per-step record of sim with the CustomUpdater appended, next to the
+    per-step times bare of the same simulation without it
+    """
+    sim.operations.updaters.append(updater)
+    try:
+        times = time_steps(sim, steps, repeat)
+    finally:
+        sim.operations.updaters.remove(updater)
+
+    result = {'case': name, 'params': params, 'unit': 'step', 'time': stats(times),
+              'bare': stats(bare)}
+    result['overhead'] = result['time']['median']-result['bare']['median']
+    result['relative'] = result['time']['median']/result['bare']['median']
+    return result
+
+
+def bare_sweep(params, sim, steps, repeat):
+    """
+    Per-step times of sim without custom updaters and their record
+    """
+    bare = time_steps(sim, steps, repeat)
+    return bare, {'case': 'bare_sweep', 'params': params, 'unit': 'step', 'time': stats(bare)}
+
+
+def hpmc_simulation(mc, positions, L, typeid=None, types=('A',), seed=1):
+    """
+    CPU simulation of the HPMC integrator mc with particles at positions in
+    a cubic box of length L
+    """
+    import hoomd
+
+    snap = hoomd.Snapshot()
+    if snap.communicator.rank == 0:
+        snap.configuration.box = [L, L, L, 0, 0, 0]
+        snap.particles.N = len(positions)
+        snap.particles.types = list(types)
+        snap.particles.position[:] = positions
+        snap.particles.orientation[:] = [1, 0, 0, 0]
+        if typeid is not None:
+            snap.particles.typeid[:] = typeid
+
+    sim = hoomd.Simulation(device=hoomd.device.CPU(num_cpu_threads=1), seed=seed)
+    sim.create_state_from_snapshot(snap)
+    sim.operations.integrator = mc
+    return sim
+
+
+@group('order_parameters', 'hpmc/lj_metad')
+def order_parameters(config):
+    """
+    compute_num_liq and compute_qc on a jittered lattice at the density of
+    the LJ metadynamics example, with and without a NeighborCache. Every
+    call first moves all particles by a small random step, as an HPMC sweep
+    would, so the cache cases include their occasional rebuilds (about one
+    in 20 calls for the 0.4 skin).
+    """
+    import gsd.hoomd
+    import freud
+    from order_parameters import NeighborCache, compute_num_liq, compute_qc
+
+    freud.parallel.set_num_threads(1)
+    for N in config['sizes']:
+        pos, L = lattice(N, 0.95**(-1/3), np.random.default_rng(config['seed']), jitter=0.1)
+
+        def step(compute, **kwargs):
+            # same walk for every case
+            rng = np.random.default_rng(config['seed'])
+            frame = gsd.hoomd.Frame()
+            frame.configuration.box = [L, L, L, 0, 0, 0]
+            frame.particles.N = N
+            frame.particles.position = pos.astype(np.float32)
+            def fn():
+                p = frame.particles.position+rng.normal(scale=0.01, size=(N, 3))
+                frame.particles.position = (p-L*np.round(p/L)).astype(np.float32)
+                return compute(frame, **kwargs)
+            return fn
+
+        for dtype in (np.float64, np.float32):
+            yield {'case': 'compute_num_liq', 'params': {'N': N, 'dtype': np.dtype(dtype).name, 'skin': None},
+                   'fn': step(compute_num_liq, dtype=dtype)}
+        yield {'case': 'compute_num_liq', 'params': {'N': N, 'dtype': 'float64', 'skin': 0.4},
+               'fn': step(compute_num_liq, neighbors=NeighborCache(0.4, num_neighbors=20))}
+        yield {'case': 'compute_qc', 'params': {'N': N, 'skin': None}, 'fn': step(compute_qc)}
+        yield {'case': 'compute_qc', 'params': {'N': N, 'skin': 0.4},
+               'fn': step(compute_qc, neighbors=NeighborCache(0.4, num_neighbors=6))}
+
+
+@group('bias', 'hpmc/lj_metad')
+def bias(config):
+    """
+    Evaluation of the exact hill sum and of the grid bias at one op (every
+    step) and at 100 ops (ebetac), and one deposition, against the number
+    of deposited hills
+    """
+    from bias import HillBias, GridBias
+
+    for n_hills, kind in itertools.product(config['hills'], ('hills', 'grid')):
+        rng = np.random.default_rng(config['seed'])
+        ops = rng.uniform(0, 100, n_hills)
+        heights = rng.uniform(0, 0.5, n_hills)
+
+        def setup():
+            b = HillBias(2.0) if kind == 'hills' else GridBias(2.0, 0, 100, 1000)
+            for op, h in zip(ops, heights):
+                b.deposit(op, h)
+            return b
+        b, retained, _ = traced(setup)
+
+        params = {'n_hills': n_hills, 'bias': kind}
+        op_space = np.linspace(0, 100, 100)
+        yield {'case': 'bias_scalar', 'params': params, 'fn': lambda: b(50.5),
+               'retained_bytes': retained}
+        yield {'case': 'bias_array', 'params': params, 'fn': lambda: b(op_space),
+               'retained_bytes': retained}
+        # deposit grows the hill list, so only a fixed number of calls
+        yield {'case': 'bias_deposit', 'params': params, 'fn': lambda: b.deposit(50.5, 0.1),
+               'retained_bytes': retained, 'number': 10}
+
+
+@group('wtmetad', 'hpmc/lj_metad')
+def wtmetad(config):
+    """
+    WTmetadUpdater on hard spheres at packing fraction 0.3. The cost of act
+    does not depend on the pair potential, so the JIT LJ patch of the
+    notebooks is left out and the bare sweep is the hard sphere sweep.
+    """
+    import hoomd
+    from metad import WTmetadUpdater
+
+    spacing = (np.pi/6/0.3)**(1/3)
+    for N in config['sizes']:
+        pos, L = lattice(N, spacing)
+        mc = hoomd.hpmc.integrate.Sphere(default_d=0.1)
+        mc.shape['A'] = dict(diameter=1.0)
+        sim = hpmc_simulation(mc, pos, L, seed=config['seed'])
+        bare, record = bare_sweep({'N': N}, sim, config['steps'], config['repeat'])
+        yield record
+
+        def make(n_hills, grid, inplace, skin, period):
+            rng = np.random.default_rng(config['seed'])
+            action = WTmetadUpdater(rng=rng, h0=0.5, sigma=2.0, T=1, dT=7, stride=50,
+                                    grid=(0, N, 1000) if grid else None,
+                                    inplace_rollback=inplace, skin=skin)
+            for op in rng.uniform(0, N, n_hills):
+                action.bias.deposit(op, 0.1)
+            action.set_init_snapshot(sim.state.get_snapshot())
+            return hoomd.update.CustomUpdater(action=action, trigger=hoomd.trigger.Periodic(period))
+
+        cases = [(0, False, False, None), (0, False, True, None), (0, False, True, 0.4)]
+        cases += [(n, grid, True, 0.4) for n in config['hills'] if n > 0 for grid in (False, True)]
+        for n_hills, grid, inplace, skin in cases:
+            params = {'N': N, 'n_hills': n_hills, 'grid': grid, 'inplace_rollback': inplace,
+                      'skin': skin}
+            updater, retained, _ = traced(lambda: make(n_hills, grid, inplace, skin, 1))
+            sim.operations.updaters.append(updater)
+            sim.run(0)
+            # timestep 1 is not a multiple of stride, so no hills are added
+            yield {'case': 'act', 'params': params, 'fn': lambda: updater.action.act(1),
+                   'retained_bytes': retained}
+            sim.operations.updaters.remove(updater)
+
+        for period in config['periods']:
+            params = {'N': N, 'n_hills': 0, 'grid': True, 'inplace_rollback': True, 'skin': 0.4,
+                      'period': period}
+            yield per_step('sim_run', params, sim, make(0, True, True, 0.4, period),
+                           config['steps'], config['repeat'], bare)
+
+
+def polyhedron_simulation(verts, N, seed, d=0.1, a=0.1):
+    """
+    HPMC convex polyhedra on a dilute simple cubic lattice
+    """
+    import hoomd
+
+    verts = np.asarray(verts)
+    pos, L = lattice(N, 2.2*np.linalg.norm(verts, axis=1).max())
+    mc = hoomd.hpmc.integrate.ConvexPolyhedron(default_d=d, default_a=a)
+    mc.shape['A'] = dict(vertices=verts)
+    return hpmc_simulation(mc, pos, L, seed=seed), pos, L
+
+
+@group('alchemy', 'digital_alchemy/truncation')
+def alchemy(config):
+    """
+    AlchemUpdater on truncated tetrahedra, with coxeter shapes or a
+    ShapeCache and with single or multiple-try moves
+    """
+    import hoomd
+    from alchemy import AlchemUpdater
+    from shape_cache import ShapeCache, truncated_tetrahedron_verts
+
+    alpha_init = 0.5
+    cache = ShapeCache(truncated_tetrahedron_verts, 0, 1)
+    for N in config['sizes']:
+        sim, _, _ = polyhedron_simulation(truncated_tetrahedron_verts(alpha_init), N, config['seed'])
+        bare, record = bare_sweep({'N': N}, sim, config['steps'], config['repeat'])
+        yield record
+
+        def make(shape_cache, n_trials, period):
+            action = AlchemUpdater(stepsize=0.001, rng=np.random.default_rng(config['seed']),
+                                   alpha_init=alpha_init, n_trials=n_trials,
+                                   shape_cache=cache if shape_cache else None)
+            return hoomd.update.CustomUpdater(action=action, trigger=hoomd.trigger.Periodic(period))
+
+        for shape_cache, n_trials in itertools.product((False, True), (1, 4)):
+            params = {'N': N, 'shape_cache': shape_cache, 'n_trials': n_trials}
+            updater = make(shape_cache, n_trials, 1)
+            sim.operations.updaters.append(updater)
+            sim.run(0)
+            yield {'case': 'act', 'params': params, 'fn': lambda: updater.action.act(sim.timestep)}
+            sim.operations.updaters.remove(updater)
+            sim.operations.integrator.shape['A'] = dict(vertices=truncated_tetrahedron_verts(alpha_init))
+
+        for period in config['periods']:
+            params = {'N': N, 'shape_cache': True, 'n_trials': 1, 'period': period}
+            yield per_step('sim_run', params, sim, make(True, 1, period),
+                           config['steps'], config['repeat'], bare)
+
+
+@group('meta_alchemy', 'digital_alchemy/truncation-metadynamics/bcc')
+def meta_alchemy(config):
+    """
+    MetaAlchemUpdater on 323+ polyhedra as in equilibriate_metadynamics.ipynb,
+    against N and the number of deposited hills
+    """
+    import hoomd
+    from meta_alchemy import MetaAlchemUpdater
+    from shape_cache import ShapeCache, family323_verts
+
+    alpha_init = 1.0
+    cache = ShapeCache(family323_verts, 1, 3)
+    for N in config['sizes']:
+        sim, _, _ = polyhedron_simulation(family323_verts(alpha_init), N, config['seed'])
+        bare, record = bare_sweep({'N': N}, sim, config['steps'], config['repeat'])
+        yield record
+
+        def make(n_hills, grid, period):
+            rng = np.random.default_rng(config['seed'])
+            action = MetaAlchemUpdater(stepsize=0.005, rng=rng, alpha_init=alpha_init,
+                                       shape_cache=cache)
+            action.set_metad_param(rng=np.random.default_rng(config['seed']+1), h0=0.1,
+                                   sigma=0.02, T=1.0, dT=8.0, stride=100, calc_ebetac=True,
+                                   grid=(1, 3, 1000) if grid else None)
+            for op in rng.uniform(1, 3, n_hills):
+                action.bias.deposit(op, 0.01)
+            return hoomd.update.CustomUpdater(action=action, trigger=hoomd.trigger.Periodic(period))
+
+        for n_hills, grid in itertools.product(config['hills'], (False, True)):
+            params = {'N': N, 'n_hills': n_hills, 'grid': grid}
+            updater, retained, _ = traced(lambda: make(n_hills, grid, 1))
+            sim.operations.updaters.append(updater)
+            sim.run(0)
+            # timestep 1 is not a multiple of stride, so no hills are added
+            yield {'case': 'act', 'params': params, 'fn': lambda: updater.action.act(1),
+                   'retained_bytes': retained}
+            sim.operations.updaters.remove(updater)
+            sim.operations.integrator.shape['A'] = dict(vertices=family323_verts(alpha_init))
+
+        for period in config['periods']:
+            params = {'N': N, 'n_hills': 0, 'grid': True, 'period': period}
+            yield per_step('sim_run', params, sim, make(0, True, period),
+                           config['steps'], config['repeat'], bare)
+
+
+@group('type_updater', 'hpmc/binary_spheres')
+def type_updater(config):
+    """
+    TypeUpdater on an equimolar binary sphere mixture with the diameters of
+    equilibriate.ipynb (alpha = 0.42), flip and swap moves, with and
+    without the undo log
+    """
+    import hoomd
+    from type_updater import TypeUpdater
+
+    r1 = (4*np.pi/3)**(-1/3)*2**(1/3)*(1/(1+0.42**3))**(1/3)
+    d1, d2 = 2*r1, 2*0.42*r1
+    for N in config['sizes']:
+        rng = np.random.default_rng(config['seed'])
+        pos, L = lattice(N, 1.2*d1)
+        typeid = rng.permutation(np.arange(N) % 2)
+        mc = hoomd.hpmc.integrate.Sphere(default_d=0.1)
+        mc.shape['A'] = dict(diameter=d1)
+        mc.shape['B'] = dict(diameter=d2)
+        sim = hpmc_simulation(mc, pos, L, typeid, types=('A', 'B'), seed=config['seed'])
+        bare, record = bare_sweep({'N': N}, sim, config['steps'], config['repeat'])
+        yield record
+
+        def make(move, undo_log, period):
+            action = TypeUpdater(rng=np.random.default_rng(config['seed']), move=move,
+                                 undo_log=undo_log)
+            return hoomd.update.CustomUpdater(action=action, trigger=hoomd.trigger.Periodic(period))
+
+        for move, undo_log in itertools.product(('flip', 'swap'), (False, True)):
+            params = {'N': N, 'move': move, 'undo_log': undo_log}
+            updater = make(move, undo_log, 1)
+            sim.operations.updaters.append(updater)
+            sim.run(0)
+            yield {'case': 'act', 'params': params, 'fn': lambda: updater.action.act(sim.timestep)}
+            sim.operations.updaters.remove(updater)
+
+        for period in config['periods']:
+            params = {'N': N, 'move': 'swap', 'undo_log': True, 'period': period}
+            yield per_step('sim_run', params, sim, make('swap', True, period),
+                           config['steps'], config['repeat'], bare)
+
+
+@group('harmonic', 'digital_alchemy/truncation')
+def harmonic(config):
+    """
+    HarmonicUpdater on truncated tetrahedra in a harmonic field with box
+    moves every step, as in the truncation example. act is timed for an
+    unchanged box (early return) and for a changed box (references rewritten).
+    """
+    import hoomd
+    from harmonic import HarmonicUpdater
+    from shape_cache import truncated_tetrahedron_verts
+
+    for N in config['sizes']:
+        sim, pos, L = polyhedron_simulation(truncated_tetrahedron_verts(0.5), N, config['seed'])
+        ori = np.tile([1., 0, 0, 0], (N, 1))
+        sim.operations.integrator.external_potential = hoomd.hpmc.external.field.Harmonic(
+            reference_positions=pos, reference_orientations=ori, k_translational=30,
+            k_rotational=10, symmetries=ori)
+        boxmc = hoomd.hpmc.update.BoxMC(trigger=hoomd.trigger.Periodic(1), betaP=1.0)
+        boxmc.volume = dict(weight=1.0, mode='standard', delta=0.1)
+        sim.operations.updaters.append(boxmc)
+        bare, record = bare_sweep({'N': N}, sim, config['steps'], config['repeat'])
+        yield record
+
+        def make(period):
+            action = HarmonicUpdater(ref_pos=pos, init_size=L)
+            return hoomd.update.CustomUpdater(action=action, trigger=hoomd.trigger.Periodic(period))
+
+        updater = make(1)
+        sim.operations.updaters.append(updater)
+        sim.run(0)
+        action = updater.action
+
+        def changed():
+            # forget the last box, so act rewrites the references
+            action._box = None
+            action.act(sim.timestep)
+
+        yield {'case': 'act', 'params': {'N': N, 'box': 'unchanged'},
+               'fn': lambda: action.act(sim.timestep)}
+        yield {'case': 'act', 'params': {'N': N, 'box': 'changed'}, 'fn': changed}
+        sim.operations.updaters.remove(updater)
+
+        for period in config['periods']:
+            yield per_step('sim_run', {'N': N, 'period': period}, sim, make(period),
+                           config['steps'], config['repeat'], bare)
+
+
+def _run_group(name, config):
+    """
+    Run one group in this process and return its records. Per-call cases
+    are dicts with case, params and fn (and optionally number and
+    retained_bytes); fn is timed and its peak memory traced here. Other
+    yielded dicts are finished records.
+    """
+    directory, fn = GROUPS[name]
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+    records = []
+    try:
+        for case in fn(config):
+            if 'fn' in case:
+                call = case.pop('fn')
+                number = case.pop('number', config['number'])
+                times = time_calls(call, number, config['repeat'])
+                _, _, peak = traced(call)
+                case.update({'unit': 'call', 'number': number, 'time': stats(times),
+                             'peak_bytes': peak})
+            case['group'] = name
+            records.append(case)
+            print(f"{name:16s} {case['case']:16s} {json.dumps(case['params'])} "
+                  f"{case['time']['median']*1e3:.4f} ms/{case['unit']}", flush=True)
+    except ImportError as e:
+        print(f'{name:16s} skipped: {e}', flush=True)
+        records.append({'group': name, 'skipped': str(e)})
+    return records
+
+
+def run(groups, config, context='spawn'):
+    """
+    Run the groups, each in a fresh process, and return all records
+    """
+    ctx = multiprocessing.get_context(context)
+    records = []
+    for name in groups:
+        with ctx.Pool(1) as pool:
+            records += pool.apply(_run_group, (name, config))
+    return records
+
+
+def _version(module):
+
+    try:
+        return importlib.import_module(module).__version__
+    except (ImportError, AttributeError):
+        pass
+    try:
+        return importlib.metadata.version(module)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def metadata(config):
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'versions': {m: _version(m) for m in ('numpy', 'freud', 'gsd', 'coxeter', 'hoomd')},
+            'config': config}
+
+
+def key(record):
+
+    return record['group'], record['case'], json.dumps(record['params'], sort_keys=True)
+
+
+def compare(records, baseline, tolerance):
+    """
+    Records whose median time exceeds the baseline median of the same case
+    by more than the relative tolerance, as (record, ratio)
+    """
+    reference = {key(r): r for r in baseline if 'time' in r}
+    slower = []
+    for r in records:
+        if 'time' in r and key(r) in reference:
+            ratio = r['time']['median']/reference[key(r)]['time']['median']
+            if ratio > 1+tolerance:
+                slower.append((r, ratio))
+    return slower
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--groups', nargs='+', choices=list(GROUPS), default=list(GROUPS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[256, 1024, 4096],
+                        help='numbers of particles N')
+    parser.add_argument('--hills', nargs='+', type=int, default=[0, 1000, 10000],
+                        help='numbers of deposited hills')
+    parser.add_argument('--periods', nargs='+', type=int, default=[1, 10, 100],
+                        help='trigger periods of the updaters in the per-step runs')
+    parser.add_argument('--steps', type=int, default=200, help='timesteps per per-step repeat')
+    parser.add_argument('--number', type=int, default=20, help='calls per per-call repeat')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=9920)
+    parser.add_argument('--quick', action='store_true',
+                        help='small sizes and few repeats, to check that everything runs')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='earlier output to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative increase of the median time')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.sizes, args.hills, args.periods = [256, 512], [0, 100], [1, 10]
+        args.steps, args.number, args.repeat = 20, 5, 3
+    config = {'sizes': args.sizes, 'hills': args.hills, 'periods': args.periods,
+              'steps': args.steps, 'number': args.number, 'repeat': args.repeat,
+              'seed': args.seed}
+
+    records = run(args.groups, config)
+    with open(args.output, 'w') as f:
+        json.dump({'metadata': metadata(config), 'results': records}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        slower = compare(records, baseline, args.tolerance)
+        for r, ratio in slower:
+            print(f"slower x{ratio:.2f}: {r['group']} {r['case']} {json.dumps(r['params'])}")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,22 +19,57 @@ class CustomAction(hoomd.custom.Action):
         super().attach(simulation)
         self._sim = simulation
         
+def box_matrix(box):
+    """
+    Upper triangular box matrix whose columns are the box vectors, from
+    (Lx, Ly, Lz, xy, xz, yz). Lz = 0 (2D) is replaced by 1 to keep it invertible.
+    """
+    Lx, Ly, Lz, xy, xz, yz = box
+    Lz = Lz if Lz != 0 else 1
+    return np.array([[Lx, xy*Ly, xz*Lz],
+                     [0, Ly, yz*Lz],
+                     [0, 0, Lz]], dtype=np.float64)
+
+
 class HarmonicUpdater(CustomAction):
     """
-    Custom alchemical updater for HPMC integrator. This updater performs trial moves on alchemical
-    parameters.
+    Custom updater that moves the reference positions of the harmonic field
+    affinely with the box, so the reference lattice follows NPT box moves.
+
+    The reference positions are stored as fractional coordinates of the
+    initial box, init_box given as (Lx, Ly, Lz, xy, xz, yz) or a cubic box of
+    length init_size, and mapped with the full box matrix, which covers
+    anisotropic and triclinic boxes. The box is read from the state without a
+    snapshot and the references are rewritten, into a preallocated buffer,
+    only when it has changed since the last call.
     """
-    def __init__(self, ref_pos, init_size):
-        self.ref_pos = ref_pos
-        self.init_size = init_size
+    def __init__(self, ref_pos, init_size=None, init_box=None):
+        if init_box is None:
+            init_box = (init_size, init_size, init_size, 0, 0, 0)
+        self._box = tuple(float(x) for x in init_box)
+        self._frac = np.asarray(ref_pos, dtype=np.float64) @ np.linalg.inv(box_matrix(self._box)).T
+        self._buffer = np.array(ref_pos, dtype=np.float64)
+        self._volume0 = np.linalg.det(box_matrix(self._box))
+        self.init_size = self._box[0]
         self.rescale = 1
         self.boxsize = self.init_size
+        self.n_updates = 0
     
     def act(self, timestep):
         
-        self.boxsize = self._sim._state.get_snapshot().configuration.box[0]
-        self.rescale = self._sim._state.get_snapshot().configuration.box[0]/self.init_size
-        self._sim._operations._integrator._external_potential._param_dict['reference_positions']=self.rescale * self.ref_pos
+        b = self._sim.state.box
+        box = (b.Lx, b.Ly, b.Lz, b.xy, b.xz, b.yz)
+        if box == self._box:
+            return
+        
+        self._box = box
+        H = box_matrix(box)
+        np.matmul(self._frac, H.T, out=self._buffer)
+        self._sim._operations._integrator._external_potential._param_dict['reference_positions']=self._buffer
+        
+        self.boxsize = box[0]
+        self.rescale = (np.linalg.det(H)/self._volume0)**(1/3)
+        self.n_updates += 1
         
     @hoomd.logging.log(category='scalar', requires_run=True)
     def rescale_factor(self):
@@ -43,4 +78,3 @@ class HarmonicUpdater(CustomAction):
     @hoomd.logging.log(category='scalar', requires_run=True)
     def boxsize_t(self):
         return self.boxsize
-    
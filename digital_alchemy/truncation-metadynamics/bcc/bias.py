@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class HillBias:
+    """
+    Bias potential kept as the explicit sum of every deposited Gaussian hill.
+    Hill centers and heights live in preallocated arrays which double in size
+    when full, so evaluating the bias never converts Python lists to arrays.
+    """
+    def __init__(self, sigma, capacity=1024):
+        self.sigma = sigma
+        self.n_hills = 0
+        self._op = np.zeros(capacity)
+        self._h = np.zeros(capacity)
+
+    @property
+    def op_hills(self):
+        return self._op[:self.n_hills]
+
+    @property
+    def h_hills(self):
+        return self._h[:self.n_hills]
+
+    def deposit(self, op, h):
+
+        if self.n_hills == len(self._op):
+            self._op = np.concatenate([self._op, np.zeros_like(self._op)])
+            self._h = np.concatenate([self._h, np.zeros_like(self._h)])
+
+        self._op[self.n_hills] = op
+        self._h[self.n_hills] = h
+        self.n_hills += 1
+
+    def op_range(self):
+        return self.op_hills.min(), self.op_hills.max()
+
+    def to_array(self):
+        return np.concatenate([[self.n_hills], self.op_hills, self.h_hills])
+
+    def from_array(self, arr):
+
+        n = int(arr[0])
+        capacity = max(len(self._op), n)
+        self._op = np.zeros(capacity)
+        self._h = np.zeros(capacity)
+        self._op[:n] = arr[1:1+n]
+        self._h[:n] = arr[1+n:1+2*n]
+        self.n_hills = n
+
+    def __call__(self, op):
+
+        op = np.asarray(op, dtype=float)
+        dop = op[..., None]-self.op_hills
+        vbias = self.h_hills * np.exp(-0.5*dop**2/self.sigma**2)
+
+        return np.sum(vbias, axis=-1)
+
+
+class GridBias:
+    """
+    Bias potential accumulated on a fixed grid of the order parameter. Each
+    deposition adds one Gaussian to the grid points within cutoff*sigma of its
+    center and lookups interpolate linearly between the two nearest grid
+    points, so both cost O(1) however many hills have been deposited. Order
+    parameters outside [op_min, op_max] see the bias at the nearest grid edge.
+    """
+    def __init__(self, sigma, op_min, op_max, nbins=1000, cutoff=5.0):
+        self.sigma = sigma
+        self.n_hills = 0
+        self.grid = np.linspace(op_min, op_max, nbins)
+        self.values = np.zeros(nbins)
+        self._dx = self.grid[1]-self.grid[0]
+        self._width = int(np.ceil(cutoff*sigma/self._dx))
+        self._op_min = np.inf
+        self._op_max = -np.inf
+
+    def deposit(self, op, h):
+
+        i = int(round((op-self.grid[0])/self._dx))
+        lo = max(i-self._width, 0)
+        hi = min(i+self._width+1, len(self.grid))
+        if lo < hi:
+            dop = self.grid[lo:hi]-op
+            self.values[lo:hi] += h * np.exp(-0.5*dop**2/self.sigma**2)
+
+        self._op_min = min(self._op_min, op)
+        self._op_max = max(self._op_max, op)
+        self.n_hills += 1
+
+    def op_range(self):
+        return self._op_min, self._op_max
+
+    def to_array(self):
+        return np.concatenate([[self.n_hills, self._op_min, self._op_max], self.values])
+
+    def from_array(self, arr):
+
+        if len(arr)-3 != len(self.values):
+            raise ValueError("Checkpointed grid does not match the number of bins")
+        self.n_hills = int(arr[0])
+        self._op_min = arr[1]
+        self._op_max = arr[2]
+        self.values[:] = arr[3:]
+
+    def __call__(self, op):
+
+        x = (np.asarray(op, dtype=float)-self.grid[0])/self._dx
+        x = np.clip(x, 0, len(self.grid)-1)
+        i = np.minimum(x.astype(int), len(self.grid)-2)
+        f = x-i
+
+        return (1-f)*self.values[i] + f*self.values[i+1]
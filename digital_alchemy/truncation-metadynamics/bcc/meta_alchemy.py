@@ -8,6 +8,9 @@ import hoomd
 import gsd.hoomd
 import coxeter
 
+from bias import HillBias, GridBias
+from checkpoint import rng_to_array, rng_from_array, read_checkpoint
+
 
 class CustomAction(hoomd.custom.Action):
     """This custom Action class extends the Action class' functionality to
@@ -27,17 +30,26 @@ class CustomAction(hoomd.custom.Action):
 
 class MetaAlchemUpdater(CustomAction):
     """
-    Custom meta-alchemical updater for HPMC integrator. This updater performs trial moves on alchemical
-    parameters.
+    Metadynamics on the alchemical parameter alpha of 323+ polyhedra for
+    HPMC. Trial moves of alpha are accepted with the bias, then checked for
+    overlaps, and hills are deposited every stride steps once
+    set_metad_param has been called. The options are described in the README.
     """
-    def __init__(self, stepsize, rng, alpha_init):
+    def __init__(self, stepsize, rng, alpha_init, shape_cache=None, n_trials=1):
         self._stepsize = stepsize
         self._counters = [0, 0]
         self._rng = rng
         self.alpha_current = alpha_init
+        self.shape_cache = shape_cache
+        self.n_trials = n_trials
+        self._displacement = 0.
+        self._act_time = 0.
         
-    def set_metad_param(self, rng, h0, sigma, T, dT, stride, calc_ebetac=True):
-        
+    def set_metad_param(self, rng, h0, sigma, T, dT, stride, calc_ebetac=True, grid=None, ebetac_every=1):
+        """
+        Well-tempered metadynamics parameters. grid=(op_min, op_max, nbins)
+        accumulates the hills on a fixed grid instead of summing them.
+        """
         self._rng_metad = rng
         self.h0 = h0
         self.sigma = sigma
@@ -48,45 +60,78 @@ class MetaAlchemUpdater(CustomAction):
         
         self.current_op = self.alpha_current
         
-        self.op_bias_arr = []
-        self.hbias_arr = []
+        if grid is None:
+            self.bias = HillBias(sigma)
+        else:
+            self.bias = GridBias(sigma, *grid)
         self.current_vbias = 0.0
         self.current_ebetac = 0.0
         
         self.calc_ebetac = calc_ebetac
+        self.ebetac_every = ebetac_every
+        self._ebetac_hills = 0
         
     def compute_vbias(self, op):
         
-        op = np.asarray(op)
-        dop = op-self.op_bias_arr
-        vbias = self.hbias_arr * np.exp(-0.5*dop**2/self.sigma**2)
-        vbias_tot = np.sum(vbias)
-        
-        return vbias_tot
+        return self.bias(op)
 
     def compute_ebetac(self):
-
-        if not self.calc_ebetac or len(self.op_bias_arr)==0:
+        """
+        ebetac of the current bias. The bias only changes when a hill is
+        deposited, so it is recomputed only every ebetac_every hills.
+        """
+        if not self.calc_ebetac or self.bias.n_hills==0:
             return 1
+
+        # the bias only changes when a hill is deposited, so keep the cached
+        # value until ebetac_every new hills have been added. It is always
+        # computed for the first hill, so it is never logged as 0.
+        if self._ebetac_hills > 0 and self.bias.n_hills-self._ebetac_hills < self.ebetac_every:
+            return self.current_ebetac
+        self._ebetac_hills = self.bias.n_hills
         
         gamma = self.bias_factor
         # ds will be cancelled out.
         # set up integration space for betav
-        min_op = min(self.op_bias_arr)
-        max_op = max(self.op_bias_arr)
+        min_op, max_op = self.bias.op_range()
         bin_op = 20
         interval_op = (max_op-min_op)/bin_op
         op_space = min_op + np.arange(bin_op) * interval_op
         
-        betav = np.array([self.compute_vbias(op_i) for op_i in op_space])
+        betav = self.compute_vbias(op_space)
         num = np.sum(np.exp(gamma/(gamma-1) * betav))
         den = np.sum(np.exp(1/(gamma-1) * betav))
         ebetac = num/den
 
         return ebetac
     
+    def restore_checkpoint(self, filename, frame=-1):
+        """
+        Continue a run from the checkpoint_* quantities logged to filename.
+        Call it after set_metad_param with the same parameters; the
+        integrator shape is then verts_from_alpha(alpha_current).
+        """
+        checkpoint = read_checkpoint(filename, self, frame)
+        state = checkpoint['state']
+        self._counters = [int(state[0]), int(state[1])]
+        self.alpha_current = state[2]
+        self.current_op = state[3]
+        self.current_vbias = state[4]
+        self.current_ebetac = state[5]
+        self._ebetac_hills = int(state[6])
+        if self.current_ebetac <= 0:
+            # no valid cached value, recompute at the next step
+            self._ebetac_hills = 0
+        self._stepsize = state[7]
+        self.bias.from_array(checkpoint['bias'])
+        rng_from_array(self._rng, checkpoint['rng'])
+        rng_from_array(self._rng_metad, checkpoint['rng_metad'])
+    
     def verts_from_alpha(self, alpha):
         
+        if self.shape_cache is not None:
+            return self.shape_cache(alpha)
+        
         f = coxeter.families.Family323Plus()
         particle = f.get_shape(alpha, 0.2*alpha+0.8)
         
@@ -94,10 +139,25 @@ class MetaAlchemUpdater(CustomAction):
     
     def act(self, timestep):
         
+        start = time.perf_counter()
+        alpha_prev = self.alpha_current
+        if self.n_trials > 1:
+            self._multiple_try_move()
+        else:
+            self._single_move()
+        self._displacement += abs(self.alpha_current-alpha_prev)
+            
+        self.current_ebetac = self.compute_ebetac()
+        if timestep%self.stride==0:
+            current_hbias = self.h0 * np.exp(-self.current_vbias/self.dT)
+            self.bias.deposit(self.current_op, current_hbias)
+        self._act_time += time.perf_counter()-start
+    
+    def _single_move(self):
+        
         # alchemical part
         # old shape
         alpha_prev = self.alpha_current
-        shape_prev = self._sim._operations.integrator.shape['A']
         
         # try a move
         step = (2 * self._rng.random() - 1) * self._stepsize
@@ -105,10 +165,6 @@ class MetaAlchemUpdater(CustomAction):
         if alpha_trial>3: alpha_trial=3
         elif alpha_trial<1: alpha_trial=1
         
-        # trial shape
-        verts_trial = self.verts_from_alpha(alpha_trial)
-        self._sim._operations.integrator.shape['A'] = {"vertices": verts_trial}
-        
         # metadynamics part
         # set old shape truncation as prev_op
         prev_op = alpha_prev
@@ -120,26 +176,85 @@ class MetaAlchemUpdater(CustomAction):
         
         pbias = np.exp(-(trial_vbias-prev_vbias)) # beta in HPMC default to be 1
         
-        overlaps = self._sim._operations.integrator.overlaps
-        if overlaps==0 and self._rng_metad.random() < pbias:
+        if self._rng_metad.random() >= pbias:
+            # rejected by the bias, the shape is not changed
+            accepted = False
+        elif alpha_trial==alpha_prev:
+            # clamped at the bound, the shape does not change
+            accepted = True
+        else:
+            accepted = self._try_shape(alpha_trial)
+        
+        self._finish_move(accepted, alpha_trial, trial_vbias, prev_vbias)
+    
+    def _log_weights(self, alphas):
+        """
+        Log Rosenbluth weights -vbias(alpha) of multiple-try candidates, -inf
+        outside [1, 3]
+        """
+        logw = -self.compute_vbias(alphas)
+        return np.where((alphas>=1) & (alphas<=3), logw, -np.inf)
+    
+    def _multiple_try_move(self):
+        """
+        Draw n_trials candidates around alpha, select one with weights
+        exp(-vbias) and accept it with the ratio of the summed weights of the
+        candidates and of n_trials-1 reference points around it plus the
+        current alpha. Only the selected shape is checked for overlaps.
+        """
+        alpha_prev = self.alpha_current
+        K = self.n_trials
+        
+        # K candidates around the current alpha
+        trials = alpha_prev + (2 * self._rng.random(K) - 1) * self._stepsize
+        logw = self._log_weights(trials)
+        logw_prev = self._log_weights(np.array([alpha_prev]))
+        if np.all(np.isinf(logw)):
+            self._finish_move(False, None, None, -logw_prev[0])
+            return
+        p = np.exp(logw-logw.max())
+        alpha_trial = trials[self._rng.choice(K, p=p/p.sum())]
+        
+        # K-1 reference points around the selected candidate, plus the current alpha
+        refs = alpha_trial + (2 * self._rng.random(K-1) - 1) * self._stepsize
+        logw_ref = np.append(self._log_weights(refs), logw_prev)
+        
+        log_ratio = np.logaddexp.reduce(logw) - np.logaddexp.reduce(logw_ref)
+        if np.log(self._rng_metad.random()) >= log_ratio:
+            # rejected by the weights, the shape is not changed
+            accepted = False
+        else:
+            accepted = self._try_shape(alpha_trial)
+        
+        self._finish_move(accepted, alpha_trial, self.compute_vbias(alpha_trial), -logw_prev[0])
+    
+    def _try_shape(self, alpha_trial):
+        """
+        Set the trial shape and keep it if it creates no overlaps. Returns
+        whether it was kept.
+        """
+        shape_prev = self._sim._operations.integrator.shape['A']
+        verts_trial = self.verts_from_alpha(alpha_trial)
+        self._sim._operations.integrator.shape['A'] = {"vertices": verts_trial}
+        if self._sim._operations.integrator.overlaps==0:
+            return True
+        self._sim._operations.integrator.shape['A'] = shape_prev
+        return False
+    
+    def _finish_move(self, accepted, alpha_trial, trial_vbias, prev_vbias):
+        
+        if accepted:
             # move was accepted
             self._counters[0] += 1
             self.alpha_current = alpha_trial
-            self.current_op = trial_op
+            self.current_op = alpha_trial
             self.current_vbias = trial_vbias
 
         else:
             # move was rejected
             self._counters[1] += 1
-            self._sim._operations.integrator.shape['A'] = shape_prev
             self.current_vbias = prev_vbias
             
-        self.current_ebetac = self.compute_ebetac()
-        if timestep%self.stride==0:
-            self.op_bias_arr.append(self.current_op)
-            current_hbias = self.h0 * np.exp(-self.current_vbias/self.dT)
-            self.hbias_arr.append(current_hbias)
-            
     @hoomd.logging.log(category='scalar', requires_run=True)
     def alpha(self):
         return self.alpha_current
@@ -159,4 +274,24 @@ class MetaAlchemUpdater(CustomAction):
     @hoomd.logging.log(category='sequence', requires_run=True)
     def alchem_moves(self):
         return tuple(self._counters)
-    
\ No newline at end of file
+    
+    @hoomd.logging.log(category='scalar', requires_run=True)
+    def displacement_rate(self):
+        return self._displacement/max(self._act_time, 1e-12)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_state(self):
+        return np.array([*self._counters, self.alpha_current, self.current_op, self.current_vbias,
+                         self.current_ebetac, self._ebetac_hills, self._stepsize], dtype=np.float64)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_bias(self):
+        return self.bias.to_array()
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_rng(self):
+        return rng_to_array(self._rng)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_rng_metad(self):
+        return rng_to_array(self._rng_metad)
@@ -0,0 +1,112 @@
+import numpy as np
+
+import hoomd
+import gsd.hoomd
+
+
+class ShapeChangeWriter(hoomd.custom.Action):
+    """
+    Custom writer that appends type_shapes of source (an HPMC integrator or
+    an anisotropic pair potential) to a gsd file only when they differ from
+    the last written ones. Each frame holds the timestep and type_shapes, so
+    shapes that never change are stored once.
+
+    The file is opened when the writer is attached and closed when it is
+    detached, e.g. removed from sim.operations.writers. Attaching it again
+    appends to the same file.
+    """
+    def __init__(self, filename, source, mode='w'):
+        self.filename = filename
+        self.source = source
+        self.mode = mode
+        self._file = None
+        self._last = None
+        self.n_written = 0
+
+    def attach(self, simulation):
+
+        super().attach(simulation)
+        if self._file is None:
+            self._file = gsd.hoomd.open(name=self.filename, mode=self.mode)
+            self.mode = 'a'
+
+    def detach(self):
+
+        self.close()
+        super().detach()
+
+    def act(self, timestep):
+
+        shapes = self.source.type_shapes
+        if shapes == self._last:
+            return
+
+        frame = gsd.hoomd.Frame()
+        frame.configuration.step = timestep
+        frame.particles.type_shapes = shapes
+        self._file.append(frame)
+        self._file.flush()
+        self._last = shapes
+        self.n_written += 1
+
+    def close(self):
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def tiered_writers(prefix, loggables, shape_source=None, log_every=10, config_every=1000,
+                   shape_every=None, filter=hoomd.filter.All()):
+    """
+    Writers for a trajectory split by cost:
+
+    - prefix_log.gsd: scalar and sequence quantities of loggables every
+      log_every steps, without particle data;
+    - prefix_traj.gsd: particle configurations every config_every steps;
+    - prefix_shape.gsd: type_shapes of shape_source, checked every
+      shape_every (default log_every) steps and written only on change.
+
+    Returns the writers to append to sim.operations.writers. Removing them
+    from the simulation closes their files.
+    """
+    logger = hoomd.logging.Logger(categories=['scalar', 'sequence'])
+    for obj in loggables:
+        logger.add(obj)
+
+    writers = [hoomd.write.GSD(filename=f'{prefix}_log.gsd',
+                               trigger=hoomd.trigger.Periodic(log_every),
+                               mode='wb',
+                               filter=hoomd.filter.Null(),
+                               log=logger),
+               hoomd.write.GSD(filename=f'{prefix}_traj.gsd',
+                               trigger=hoomd.trigger.Periodic(config_every),
+                               mode='wb',
+                               filter=filter)]
+
+    if shape_source is not None:
+        shape_every = log_every if shape_every is None else shape_every
+        action = ShapeChangeWriter(f'{prefix}_shape.gsd', shape_source)
+        writers.append(hoomd.write.CustomWriter(action=action,
+                                                trigger=hoomd.trigger.Periodic(shape_every)))
+    return writers
+
+
+def read_shapes(filename):
+    """
+    Timesteps and type_shapes written by ShapeChangeWriter
+    """
+    with gsd.hoomd.open(filename) as f:
+        steps = np.array([frame.configuration.step for frame in f])
+        shapes = [frame.particles.type_shapes for frame in f]
+    return steps, shapes
+
+
+def shape_at(steps, shapes, timestep):
+    """
+    type_shapes in effect at timestep, from read_shapes
+    """
+    i = np.searchsorted(steps, timestep, side='right')-1
+    if i < 0:
+        raise ValueError(f'no shape written at or before step {timestep}')
+    return shapes[i]
@@ -1,8 +1,11 @@
+import time
 import numpy as np
 
 import hoomd
 import coxeter
 
+from checkpoint import rng_to_array, rng_from_array, read_checkpoint
+
 
 class CustomAction(hoomd.custom.Action):
     """This custom Action class extends the Action class' functionality to
@@ -21,27 +24,58 @@ class CustomAction(hoomd.custom.Action):
         
 class AlchemUpdater(CustomAction):
     """
-    Custom alchemical updater for HPMC integrator. This updater performs trial moves on alchemical
-    parameters.
+    Alchemical updater for HPMC: trial moves of the truncation alpha of the
+    particle shape, kept when the new shape creates no overlaps. The
+    options are described in the README.
     """
-    def __init__(self, stepsize, rng, alpha_init):
+    def __init__(self, stepsize, rng, alpha_init, shape_cache=None, bias=None, n_trials=1):
         self._stepsize = stepsize
         self._counters = [0, 0]
         self._rng = rng
         self.alpha_current = alpha_init
+        self.shape_cache = shape_cache
+        self.bias = bias
+        self.n_trials = n_trials
+        self._displacement = 0.
+        self._act_time = 0.
     
     def verts_from_alpha(self, alpha):
         
+        if self.shape_cache is not None:
+            return self.shape_cache(alpha)
+        
         platonic = coxeter.families.TruncatedTetrahedronFamily()
         particle = platonic.get_shape(truncation=alpha)
         
         return particle.vertices/particle.volume**(1/3)
     
+    def restore_checkpoint(self, filename, frame=-1):
+        """
+        Continue a run from the checkpoint_* quantities logged to filename.
+        The integrator shape is then verts_from_alpha(alpha_current).
+        """
+        checkpoint = read_checkpoint(filename, self, frame)
+        state = checkpoint['state']
+        self._counters = [int(state[0]), int(state[1])]
+        self.alpha_current = state[2]
+        self._stepsize = state[3]
+        rng_from_array(self._rng, checkpoint['rng'])
+    
     def act(self, timestep):
         
+        start = time.perf_counter()
+        alpha_prev = self.alpha_current
+        if self.n_trials > 1:
+            self._multiple_try_move()
+        else:
+            self._single_move()
+        self._displacement += abs(self.alpha_current-alpha_prev)
+        self._act_time += time.perf_counter()-start
+    
+    def _single_move(self):
+        
         # old shape
         alpha_prev = self.alpha_current
-        verts_prev = self._sim._operations.integrator.shape['A']
         
         # try a move
         step = (2 * self._rng.random() - 1) * self._stepsize
@@ -49,7 +83,67 @@ class AlchemUpdater(CustomAction):
         if alpha_trial>1: alpha_trial=1
         elif alpha_trial<0: alpha_trial=0
         
-        # trial shape
+        if alpha_trial==alpha_prev:
+            # clamped at the bound, the shape does not change
+            self._counters[0] += 1
+            return
+        
+        if self.bias is not None:
+            pbias = np.exp(-(self.bias(alpha_trial)-self.bias(alpha_prev)))
+            if self._rng.random() >= pbias:
+                # rejected by the bias, no overlap check needed
+                self._counters[1] += 1
+                return
+        
+        self._try_shape(alpha_trial)
+    
+    def _log_weights(self, alphas):
+        """
+        Log Rosenbluth weights -bias(alpha) of multiple-try candidates, -inf
+        outside [0, 1]
+        """
+        if self.bias is None:
+            logw = np.zeros(len(alphas))
+        else:
+            logw = -np.asarray(self.bias(alphas), dtype=np.float64)
+        return np.where((alphas>=0) & (alphas<=1), logw, -np.inf)
+    
+    def _multiple_try_move(self):
+        """
+        Draw n_trials candidates around alpha, select one with weights
+        exp(-bias) and accept it with the ratio of the summed weights of the
+        candidates and of n_trials-1 reference points around it plus the
+        current alpha. Only the selected shape is checked for overlaps.
+        """
+        alpha_prev = self.alpha_current
+        K = self.n_trials
+        
+        # K candidates around the current alpha
+        trials = alpha_prev + (2 * self._rng.random(K) - 1) * self._stepsize
+        logw = self._log_weights(trials)
+        if np.all(np.isinf(logw)):
+            self._counters[1] += 1
+            return
+        p = np.exp(logw-logw.max())
+        alpha_trial = trials[self._rng.choice(K, p=p/p.sum())]
+        
+        # K-1 reference points around the selected candidate, plus the current alpha
+        refs = alpha_trial + (2 * self._rng.random(K-1) - 1) * self._stepsize
+        logw_ref = self._log_weights(np.append(refs, alpha_prev))
+        
+        log_ratio = np.logaddexp.reduce(logw) - np.logaddexp.reduce(logw_ref)
+        if np.log(self._rng.random()) >= log_ratio:
+            # rejected by the weights, no overlap check needed
+            self._counters[1] += 1
+            return
+        
+        self._try_shape(alpha_trial)
+    
+    def _try_shape(self, alpha_trial):
+        """
+        Set the trial shape and keep it if it creates no overlaps
+        """
+        verts_prev = self._sim._operations.integrator.shape['A']
         verts_trial = self.verts_from_alpha(alpha_trial)
         self._sim._operations.integrator.shape['A'] = {"vertices": verts_trial}
         
@@ -72,3 +166,14 @@ class AlchemUpdater(CustomAction):
     def alchem_moves(self):
         return tuple(self._counters)
     
+    @hoomd.logging.log(category='scalar', requires_run=True)
+    def displacement_rate(self):
+        return self._displacement/max(self._act_time, 1e-12)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_state(self):
+        return np.array([*self._counters, self.alpha_current, self._stepsize], dtype=np.float64)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_rng(self):
+        return rng_to_array(self._rng)
@@ -0,0 +1,130 @@
+import multiprocessing
+import numpy as np
+
+
+class HarmonicRestraint:
+    """
+    Harmonic restraint 0.5*k*(alpha-center)^2 on alpha in units of kT
+    """
+    def __init__(self, center, k):
+        self.center = center
+        self.k = k
+
+    def __call__(self, alpha):
+        return 0.5*self.k*(alpha-self.center)**2
+
+
+def _worker(conn, make_simulation, index, restraint):
+    """
+    Replica process. make_simulation(index) builds the simulation and
+    returns it with its AlchemUpdater action; the worker then serves run and
+    restraint commands from the driver until it is closed.
+    """
+    sim, updater = make_simulation(index)
+    updater.bias = restraint
+
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == 'run':
+            sim.run(arg)
+            conn.send(updater.alpha_current)
+        elif cmd == 'bias':
+            updater.bias = arg
+            conn.send(None)
+        elif cmd == 'close':
+            conn.send(tuple(updater._counters))
+            break
+    conn.close()
+
+
+class ReplicaExchange:
+    """
+    Replica exchange in alchemical alpha space. One HPMC simulation per
+    restraint runs in its own process; every exchange_every steps the
+    restraints of neighboring replicas (alternating even and odd pairs) are
+    swapped with probability
+    exp(-[U_i(a_j)+U_j(a_i)-U_i(a_i)-U_j(a_j)]), which is exact for hard
+    particles since only the restraints contribute to the energy. Swapping
+    restraints instead of configurations means only a few numbers move
+    between processes.
+
+    make_simulation(index) must return (simulation, AlchemUpdater action)
+    and be picklable when the start method is not fork.
+    """
+    def __init__(self, make_simulation, restraints, exchange_every, seed=0, context=None):
+        self.restraints = list(restraints)
+        self.exchange_every = exchange_every
+        self._rng = np.random.default_rng(seed)
+
+        n = len(self.restraints)
+        # worker_of[r] is the replica currently holding restraint r
+        self.worker_of = np.arange(n)
+        self.alphas = np.zeros(n)
+        self.n_attempts = np.zeros(n-1, dtype=np.int64)
+        self.n_accepts = np.zeros(n-1, dtype=np.int64)
+        self._n_exchanges = 0
+
+        ctx = multiprocessing.get_context(context)
+        self._conns = []
+        self._procs = []
+        for index, restraint in enumerate(self.restraints):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(child, make_simulation, index, restraint))
+            proc.start()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    def run(self, n_exchanges):
+
+        for _ in range(n_exchanges):
+            for conn in self._conns:
+                conn.send(('run', self.exchange_every))
+            self.alphas = np.array([conn.recv() for conn in self._conns])
+            self._attempt_exchanges()
+
+    def _attempt_exchanges(self):
+
+        changed = []
+        for r in range(self._n_exchanges % 2, len(self.restraints)-1, 2):
+            wi, wj = self.worker_of[r], self.worker_of[r+1]
+            ui, uj = self.restraints[r], self.restraints[r+1]
+            ai, aj = self.alphas[wi], self.alphas[wj]
+
+            delta = ui(aj) + uj(ai) - ui(ai) - uj(aj)
+            self.n_attempts[r] += 1
+            # compared in log space, exp(-delta) overflows for large negative delta
+            if np.log(self._rng.random()) < -delta:
+                self.n_accepts[r] += 1
+                self.worker_of[r], self.worker_of[r+1] = wj, wi
+                changed += [r, r+1]
+        self._n_exchanges += 1
+
+        for r in changed:
+            self._conns[self.worker_of[r]].send(('bias', self.restraints[r]))
+        for r in changed:
+            self._conns[self.worker_of[r]].recv()
+
+    @property
+    def exchange_rates(self):
+        """
+        Accepted fraction of exchange attempts between restraints r and r+1
+        """
+        return self.n_accepts/np.maximum(self.n_attempts, 1)
+
+    def close(self):
+        """
+        Stop the replicas and return their alchemical move counters, ordered
+        by replica index.
+        """
+        for conn in self._conns:
+            conn.send(('close', None))
+        counters = [conn.recv() for conn in self._conns]
+        for proc in self._procs:
+            proc.join()
+        return counters
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,111 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import coxeter
+
+
+def truncated_tetrahedron_verts(alpha):
+    """
+    Unit volume vertices of the truncated tetrahedron with truncation alpha
+    """
+    platonic = coxeter.families.TruncatedTetrahedronFamily()
+    particle = platonic.get_shape(truncation=alpha)
+
+    return particle.vertices/particle.volume**(1/3)
+
+def family323_verts(alpha):
+    """
+    Unit volume vertices of the 323+ family along the path c = 0.2*a+0.8
+    """
+    f = coxeter.families.Family323Plus()
+    particle = f.get_shape(alpha, 0.2*alpha+0.8)
+
+    return particle.vertices/particle.volume**(1/3)
+
+
+class ShapeCache:
+    """
+    Precomputed table of unit volume vertices on a fine alpha grid for an
+    alchemical shape family, so trial moves do not construct coxeter shapes.
+
+    Between two grid points the vertices are interpolated linearly when both
+    have the same number of vertices and no vertex moves by more than
+    max_jump, i.e. the vertices correspond one to one. Elsewhere, e.g. where
+    the topology changes, the exact shape is computed and kept in an LRU of
+    lru_size entries. With filename the table is loaded from an .npz file if
+    it matches the grid, and written there otherwise.
+    """
+    def __init__(self, verts_fn, alpha_min, alpha_max, n_grid=1001, lru_size=128,
+                 interpolate=True, max_jump=0.05, filename=None):
+        self.verts_fn = verts_fn
+        self.alphas = np.linspace(alpha_min, alpha_max, n_grid)
+        self.lru_size = lru_size
+        self.interpolate = interpolate
+        self.max_jump = max_jump
+        self.n_exact = 0
+        self._lru = OrderedDict()
+
+        if filename is not None and os.path.exists(filename) and self.load(filename):
+            return
+
+        table = [np.asarray(verts_fn(alpha), dtype=np.float64) for alpha in self.alphas]
+        self._set_table(np.array([len(v) for v in table]), np.concatenate(table))
+        if filename is not None:
+            self.save(filename)
+
+    def _set_table(self, counts, flat):
+
+        self._counts = counts
+        self._flat = flat
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # intervals where linear interpolation of the vertices is valid
+        self._valid = np.zeros(len(self.alphas)-1, dtype=bool)
+        for k in range(len(self.alphas)-1):
+            if counts[k] == counts[k+1]:
+                jump = np.abs(self._grid_verts(k+1)-self._grid_verts(k)).max()
+                self._valid[k] = jump <= self.max_jump
+
+    def _grid_verts(self, k):
+        return self._flat[self._offsets[k]:self._offsets[k+1]]
+
+    def save(self, filename):
+        np.savez(filename, alphas=self.alphas, counts=self._counts, flat=self._flat)
+
+    def load(self, filename):
+        """
+        Load a table written by save. Returns False if its grid differs.
+        """
+        data = np.load(filename)
+        if len(data['alphas']) != len(self.alphas) or not np.allclose(data['alphas'], self.alphas):
+            return False
+        self._set_table(data['counts'], data['flat'])
+        return True
+
+    def exact(self, alpha):
+
+        if alpha in self._lru:
+            self._lru.move_to_end(alpha)
+            return self._lru[alpha]
+
+        verts = np.asarray(self.verts_fn(alpha), dtype=np.float64)
+        self.n_exact += 1
+        self._lru[alpha] = verts
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+        return verts
+
+    def __call__(self, alpha):
+
+        x = (alpha-self.alphas[0])/(self.alphas[1]-self.alphas[0])
+        if x < 0 or x > len(self.alphas)-1:
+            return self.exact(alpha)
+        k = min(int(x), len(self.alphas)-2)
+        f = x-k
+
+        if f == 0 or f == 1:
+            return self._grid_verts(k+int(f)).copy()
+        if self.interpolate and self._valid[k]:
+            return (1-f)*self._grid_verts(k) + f*self._grid_verts(k+1)
+        return self.exact(alpha)
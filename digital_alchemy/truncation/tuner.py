@@ -0,0 +1,49 @@
+import hoomd
+
+
+class AlchemStepSizeTuner(hoomd.custom.Action):
+    """
+    Custom tuner scaling the stepsize of an AlchemUpdater or MetaAlchemUpdater
+    toward a target acceptance ratio, like hoomd.hpmc.tune.MoveSize with the
+    scale solver: stepsize *= (acceptance+gamma)/(target+gamma), where the
+    acceptance is measured from the alchem_moves counters since the last
+    update. Attach it with hoomd.tune.CustomTuner and a trigger limited to
+    the equilibration window, e.g. And([Periodic(100), Before(t_eq)]), so
+    production sampling runs with a fixed step size.
+    """
+    def __init__(self, updater, target=0.2, gamma=1.0, max_stepsize=None, min_moves=10):
+        super().__init__()
+        self.updater = getattr(updater, 'action', updater)
+        self.target = target
+        self.gamma = gamma
+        self.max_stepsize = max_stepsize
+        self.min_moves = min_moves
+        self.acceptance = 0.
+        self._last = None
+
+    def act(self, timestep):
+
+        counters = tuple(self.updater._counters)
+        if self._last is None:
+            self._last = counters
+            return
+
+        accepted = counters[0]-self._last[0]
+        total = accepted + counters[1]-self._last[1]
+        if total < self.min_moves:
+            return
+
+        self.acceptance = accepted/total
+        stepsize = self.updater._stepsize * (self.acceptance+self.gamma)/(self.target+self.gamma)
+        if self.max_stepsize is not None:
+            stepsize = min(stepsize, self.max_stepsize)
+        self.updater._stepsize = stepsize
+        self._last = counters
+
+    @hoomd.logging.log(category='scalar', requires_run=True)
+    def alchem_acceptance(self):
+        return self.acceptance
+
+    @hoomd.logging.log(category='scalar', requires_run=True)
+    def stepsize(self):
+        return self.updater._stepsize
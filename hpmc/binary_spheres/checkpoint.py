@@ -0,0 +1,36 @@
+import json
+import numpy as np
+
+import gsd.hoomd
+
+
+def rng_to_array(rng):
+    """
+    Encode the bit generator state of a numpy Generator as a uint8 array of
+    JSON text, so it can be logged to a GSD file.
+    """
+    return np.frombuffer(json.dumps(rng.bit_generator.state).encode(), dtype=np.uint8)
+
+def rng_from_array(rng, arr):
+    """
+    Restore the bit generator state of rng from rng_to_array output.
+    """
+    rng.bit_generator.state = json.loads(np.asarray(arr, dtype=np.uint8).tobytes().decode())
+
+def read_checkpoint(filename, action, frame=-1):
+    """
+    Read the checkpoint_* log quantities of a custom action from one frame of
+    a GSD file. Returns a dict keyed by the name after checkpoint_.
+    """
+    marker = type(action).__name__ + '/checkpoint_'
+    with gsd.hoomd.open(filename, 'r') as traj:
+        log = traj[frame].log
+
+    checkpoint = {}
+    for key, value in log.items():
+        if marker in key:
+            checkpoint[key.split(marker)[-1]] = value
+
+    if not checkpoint:
+        raise ValueError(f"No {type(action).__name__} checkpoint found in {filename}")
+    return checkpoint
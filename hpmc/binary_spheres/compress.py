@@ -4,15 +4,9 @@ import numpy as np
 import hoomd
 
 
-#### initializing snapshot
-cpu = hoomd.device.CPU()
-sim = hoomd.Simulation(device=cpu, seed=59920)
-sim.create_state_from_gsd(filename='./DATA/randomize.gsd', frame=-1)
-
-
 #### integrator
 def compute_d1d2(alpha):
-        
+
     const = (4*np.pi/3)**(-1/3)
     volume_of_two_types = 2.0
     pre_factor = const * (volume_of_two_types)**(1/3)
@@ -22,60 +16,75 @@ def compute_d1d2(alpha):
 
     return 2*r1, 2*r2
 
-alpha = 0.42
-d1, d2 = compute_d1d2(alpha)
 
-mc = hoomd.hpmc.integrate.Sphere(default_d=0.3, default_a=0.4)
-mc.shape["A"] = dict(diameter=d1)
-mc.shape["B"] = dict(diameter=d2)
+def compress(output, input, alpha=0.42, phi=0.57, seed=59920, max_steps=1e6):
+    """
+    Compress a randomized binary sphere mixture with size ratio alpha to the
+    packing fraction phi. Usable as a sweep.Stage.
+    """
+    #### initializing snapshot
+    cpu = hoomd.device.CPU()
+    sim = hoomd.Simulation(device=cpu, seed=seed)
+    sim.create_state_from_gsd(filename=input, frame=-1)
+
+    d1, d2 = compute_d1d2(alpha)
+
+    mc = hoomd.hpmc.integrate.Sphere(default_d=0.3, default_a=0.4)
+    mc.shape["A"] = dict(diameter=d1)
+    mc.shape["B"] = dict(diameter=d2)
+
+
+    #### quick compress
+    # calculate volume of each particle
+    r_particle = 0.5 * np.array(compute_d1d2(alpha))
+    V_particle = (4*np.pi/3) * r_particle**3
+    idx = sim.state.get_snapshot().particles.typeid
+    V = np.sum(V_particle[idx])
+
+    initial_box = sim.state.box
+    final_box = hoomd.Box.from_box(initial_box)
+    final_box.volume = V / phi
+    quick_compress = hoomd.hpmc.update.QuickCompress(trigger=hoomd.trigger.Periodic(100),
+                                                     target_box=final_box)
+
+    periodic = hoomd.trigger.Periodic(10)
+    tune = hoomd.hpmc.tune.MoveSize.scale_solver(moves=['a', 'd'],
+                                                 target=0.2,
+                                                 trigger=periodic,
+                                                 max_translation_move=0.2,
+                                                 max_rotation_move=0.2)
 
 
-#### quick compress
-# calculate volume of each particle
-r_particle = 0.5 * np.array(compute_d1d2(0.42))
-V_particle = (4*np.pi/3) * r_particle**3
-idx = sim.state.get_snapshot().particles.typeid
-V = np.sum(V_particle[idx])
+    #### write
+    logger = hoomd.logging.Logger()
+    logger.add(mc, quantities=['type_shapes'])
 
-final_volume_fraction = 0.57
+    gsd_writer = hoomd.write.GSD(filename=output,
+                                 trigger=hoomd.trigger.Periodic(100),
+                                 mode='wb',
+                                 filter=hoomd.filter.All(),
+                                 log=logger)
 
-initial_box = sim.state.box
-final_box = hoomd.Box.from_box(initial_box)
-final_box.volume = V / final_volume_fraction
-compress = hoomd.hpmc.update.QuickCompress(trigger=hoomd.trigger.Periodic(100),
-                                           target_box=final_box)
 
-periodic = hoomd.trigger.Periodic(10)
-tune = hoomd.hpmc.tune.MoveSize.scale_solver(moves=['a', 'd'],
-                                             target=0.2,
-                                             trigger=periodic,
-                                             max_translation_move=0.2,
-                                             max_rotation_move=0.2)
+    #### attaching operations
+    sim.operations.writers.append(gsd_writer)
+    sim.operations.integrator = mc
+    sim.operations.updaters.append(quick_compress)
+    sim.operations.tuners.append(tune)
 
 
-#### write
-logger = hoomd.logging.Logger()
-logger.add(mc, quantities=['type_shapes'])
+    #### run simulation
+    while not quick_compress.complete and sim.timestep < max_steps:
+        sim.run(1000)
 
-gsd_writer = hoomd.write.GSD(filename='./DATA/compress.gsd',
-                             trigger=hoomd.trigger.Periodic(100),
-                             mode='wb',
-                             filter=hoomd.filter.All(),
-                             log=logger)
 
+    #### check compress
+    if not quick_compress.complete:
+        raise RuntimeError("Compression failed to complete")
 
-#### attaching operations
-sim.operations.writers.append(gsd_writer)
-sim.operations.integrator = mc
-sim.operations.updaters.append(compress)
-sim.operations.tuners.append(tune)
+    # removing the writer closes the file
+    sim.operations.writers.remove(gsd_writer)
 
 
-#### run simulation
-while not compress.complete and sim.timestep < 1e6:
-    sim.run(1000)
-    
-    
-#### check compress
-if not compress.complete:
-    raise RuntimeError("Compression failed to complete")
\ No newline at end of file
+if __name__ == '__main__':
+    compress('./DATA/compress.gsd', './DATA/randomize.gsd', alpha=0.42, phi=0.57)
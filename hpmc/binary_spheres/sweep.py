@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import itertools
+import multiprocessing
+
+
+class Stage:
+    """
+    One step of a workflow, e.g. compress or anneal. fn(output, input,
+    **kwargs) runs the step from the gsd file input (None for the first stage
+    without a source) and writes its result to output. params names the
+    entries of a grid point passed as kwargs; only these and the upstream
+    stages determine the cached output.
+    """
+    def __init__(self, name, fn, params=()):
+        self.name = name
+        self.fn = fn
+        self.params = tuple(params)
+
+
+def expand_grid(grid):
+    """
+    All combinations of a dict of parameter lists, as a list of dicts
+    """
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def _run_stage(fn, output, input, kwargs):
+
+    # write to a temporary file so an interrupted stage is never mistaken
+    # for a finished one
+    part = output + '.part'
+    fn(part, input, **kwargs)
+    os.replace(part, output)
+    return output
+
+
+class Sweep:
+    """
+    Runs a chain of stages over a grid of parameters in a local process
+    pool, caching the output of every stage in cache_dir.
+
+    The output of a stage is named after a hash of its name, its parameters
+    and the key of the stage before it, so grid points that share the
+    upstream part of a chain (e.g. one anneal for several pressures) run it
+    only once, and stages whose output already exists are skipped when the
+    sweep is rerun or extended. Stages run level by level: all distinct
+    first stages in parallel, then all second stages, and so on.
+
+    Example, compressing binary spheres over size ratios and packing fractions:
+
+        sweep = Sweep([Stage('compress', compress, ('alpha', 'phi', 'seed'))],
+                      cache_dir='./DATA/sweep', source='./DATA/randomize.gsd')
+        results = sweep.run({'alpha': [0.3, 0.42, 0.5], 'phi': [0.55, 0.57], 'seed': [1]})
+    """
+    def __init__(self, stages, cache_dir, source=None, processes=None, context=None):
+        self.stages = list(stages)
+        self.cache_dir = cache_dir
+        self.source = source
+        self.processes = processes
+        self.context = context
+        self.n_run = 0
+        self.n_cached = 0
+
+    def key(self, stage, point, upstream):
+
+        params = {p: point[p] for p in stage.params}
+        text = json.dumps([stage.name, params, upstream], sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def plan(self, points):
+        """
+        Output files of every stage for every grid point, as a list of
+        {stage name: path} dicts
+        """
+        paths = []
+        for point in points:
+            upstream = self.source
+            outputs = {}
+            for stage in self.stages:
+                key = self.key(stage, point, upstream)
+                outputs[stage.name] = os.path.join(self.cache_dir, f'{stage.name}-{key}.gsd')
+                upstream = key
+            paths.append(outputs)
+        return paths
+
+    def run(self, grid):
+        """
+        Run the sweep over a dict of parameter lists (all combinations) or a
+        list of parameter dicts. Returns a list of (point, {stage name: path}).
+        """
+        points = expand_grid(grid) if isinstance(grid, dict) else list(grid)
+        paths = self.plan(points)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        ctx = multiprocessing.get_context(self.context)
+        with ctx.Pool(self.processes) as pool:
+            for level, stage in enumerate(self.stages):
+                tasks = {}
+                for point, outputs in zip(points, paths):
+                    output = outputs[stage.name]
+                    if output in tasks:
+                        continue
+                    if os.path.exists(output):
+                        self.n_cached += 1
+                        continue
+                    input = self.source if level == 0 else outputs[self.stages[level-1].name]
+                    kwargs = {p: point[p] for p in stage.params}
+                    tasks[output] = (stage.fn, output, input, kwargs)
+
+                pool.starmap(_run_stage, tasks.values())
+                self.n_run += len(tasks)
+
+        return list(zip(points, paths))
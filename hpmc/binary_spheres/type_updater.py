@@ -3,6 +3,8 @@ import numpy as np
 import hoomd
 import coxeter
 
+from checkpoint import rng_to_array, rng_from_array, read_checkpoint
+
 
 class CustomAction(hoomd.custom.Action):
     """This custom Action class extends the Action class' functionality to
@@ -21,27 +23,81 @@ class CustomAction(hoomd.custom.Action):
         
 class TypeUpdater(CustomAction):
     """
-    Custom alchemical updater for HPMC integrator. This updater performs trial moves on alchemical
-    parameters.
+    Composition updater for binary HPMC spheres. move='flip' changes the
+    type of n_moves random particles, move='swap' exchanges the types of
+    n_moves A-B pairs so the composition stays fixed. Moves that create
+    overlaps are rejected.
     """
-    def __init__(self, rng):
+    def __init__(self, rng, n_moves=5, move='flip', undo_log=True):
+        if move not in ('flip', 'swap'):
+            raise ValueError("move must be 'flip' or 'swap'")
         self._rng = rng
+        self.n_moves = n_moves
+        self.move = move
+        self.undo_log = undo_log
         self._counters = [0, 0]
     
-    def act(self, timestep):
+    def restore_checkpoint(self, filename, frame=-1):
+        """
+        Continue a run from the checkpoint_* quantities logged to filename.
+        """
+        checkpoint = read_checkpoint(filename, self, frame)
+        state = checkpoint['state']
+        self._counters = [int(state[0]), int(state[1])]
+        rng_from_array(self._rng, checkpoint['rng'])
+    
+    def _sample_type(self, typeid, t, n):
+        """
+        n distinct random indices of particles of type t, drawn by rejection
+        so the typeid array is not scanned. Returns None if there are fewer
+        than n such particles.
+        """
+        found = np.empty(0, dtype=np.int64)
+        for _ in range(100):
+            trial = self._rng.integers(len(typeid), size=2*n)
+            found = np.concatenate([found, trial[typeid[trial]==t]])
+            _, first = np.unique(found, return_index=True)
+            found = found[np.sort(first)]
+            if len(found) >= n:
+                return found[:n]
         
-        # old snapshot
-        old_snap = self._sim.state.get_snapshot()
-        N_particles = old_snap.particles.N
-        idx = np.random.choice(N_particles, 5)
+        # rare type, fall back to a full scan
+        candidates = np.flatnonzero(np.asarray(typeid)==t)
+        if len(candidates) < n:
+            return None
+        return self._rng.choice(candidates, n, replace=False)
+    
+    def _swap_indices(self, typeid):
+        
+        idx_a = self._sample_type(typeid, 0, self.n_moves)
+        idx_b = self._sample_type(typeid, 1, self.n_moves)
+        if idx_a is None or idx_b is None:
+            return None
+        return np.concatenate([idx_a, idx_b])
+    
+    def act(self, timestep):
+        """
+        With undo_log only the old typeids of the changed particles are
+        kept to undo a rejected move, instead of a full snapshot.
+        """
+        if not self.undo_log:
+            # old snapshot
+            old_snap = self._sim.state.get_snapshot()
         
         # trial
         with self._sim.state.cpu_local_snapshot as snapshot:
-            idx0 = np.where(snapshot.particles.typeid[idx]==0)
-            idx1 = np.where(snapshot.particles.typeid[idx]==1)
-
-            snapshot.particles.typeid[idx[idx0]]=1
-            snapshot.particles.typeid[idx[idx1]]=0
+            typeid = snapshot.particles.typeid
+            if self.move == 'swap':
+                idx = self._swap_indices(typeid)
+                if idx is None:
+                    # not enough particles of one type to swap
+                    self._counters[1] += 1
+                    return
+            else:
+                idx = self._rng.choice(len(typeid), self.n_moves)
+            
+            old_types = np.array(typeid[idx])
+            typeid[idx] = 1-old_types
 
         overlaps = self._sim._operations.integrator.overlaps
         if  overlaps==0:
@@ -51,9 +107,21 @@ class TypeUpdater(CustomAction):
         else:
             # move was rejected
             self._counters[1] += 1
-            self._sim.state.set_snapshot(old_snap)
+            if self.undo_log:
+                with self._sim.state.cpu_local_snapshot as snapshot:
+                    snapshot.particles.typeid[idx] = old_types
+            else:
+                self._sim.state.set_snapshot(old_snap)
             
 
     @hoomd.logging.log(category='sequence', requires_run=True)
     def moves(self):
-        return tuple(self._counters)
\ No newline at end of file
+        return tuple(self._counters)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_state(self):
+        return np.array(self._counters, dtype=np.float64)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_rng(self):
+        return rng_to_array(self._rng)
@@ -0,0 +1,291 @@
+import abc
+import time
+import itertools
+import numpy as np
+import freud
+
+from order_parameters import coordination, num_liq, liquid_like, NeighborCache
+
+
+cv_registry = {}
+
+def register_cv(name):
+    """
+    Class decorator adding a CollectiveVariable subclass to cv_registry.
+    """
+    def decorator(cls):
+        cls.name = name
+        cv_registry[name] = cls
+        return cls
+    return decorator
+
+def make_cv(name, **kwargs):
+    return cv_registry[name](**kwargs)
+
+
+class CollectiveVariable(abc.ABC):
+    """
+    Common interface of collective variables. Subclasses implement
+    compute(box, points, orientations) for one configuration and return a
+    scalar. Calling the object times every evaluation; batch evaluates a
+    sequence of frames, e.g. a gsd.hoomd trajectory, for offline analysis.
+    """
+    uses_orientations = False
+
+    def __init__(self):
+        self.n_calls = 0
+        self.total_time = 0.
+
+    @abc.abstractmethod
+    def compute(self, box, points, orientations=None):
+        pass
+
+    def __call__(self, box, points, orientations=None):
+
+        start = time.perf_counter()
+        value = self.compute(box, points, orientations)
+        self.total_time += time.perf_counter()-start
+        self.n_calls += 1
+
+        return value
+
+    def compute_batch(self, boxes, points, orientations=None):
+        """
+        Values of F configurations with the same number of particles, boxes
+        (F, 6), points (F, N, 3) and orientations (F, N, 4). CVs written in
+        plain numpy override this to evaluate all frames at once; the
+        default calls compute frame by frame.
+        """
+        if orientations is None:
+            orientations = itertools.repeat(None)
+        return np.array([self.compute(b, p, o) for b, p, o in zip(boxes, points, orientations)])
+
+    def batch(self, frames, chunk_size=64):
+        """
+        Values of a sequence of frames, e.g. a gsd.hoomd trajectory. Frames
+        are read chunk_size at a time and evaluated with compute_batch.
+        """
+        values = []
+        frames = iter(frames)
+        while True:
+            chunk = list(itertools.islice(frames, chunk_size))
+            if not chunk:
+                break
+
+            start = time.perf_counter()
+            sizes = {len(f.particles.position) for f in chunk}
+            # frames with different numbers of particles cannot be stacked
+            groups = [chunk] if len(sizes) == 1 else [[f] for f in chunk]
+            for group in groups:
+                boxes = np.array([f.configuration.box for f in group], dtype=np.float64)
+                points = np.array([f.particles.position for f in group])
+                orientations = None
+                if self.uses_orientations:
+                    orientations = np.array([f.particles.orientation for f in group])
+                values.append(self.compute_batch(boxes, points, orientations))
+            self.total_time += time.perf_counter()-start
+            self.n_calls += len(chunk)
+
+        return np.concatenate(values) if values else np.zeros(0)
+
+    @property
+    def time_per_call(self):
+        return self.total_time/max(self.n_calls, 1)
+
+
+@register_cv('num_liq')
+class NumLiquid(CollectiveVariable):
+    """
+    Contiuous number of liquids, see order_parameters.num_liq
+    """
+    def __init__(self, skin=None, dtype=np.float64):
+        super().__init__()
+        self.dtype = dtype
+        if skin is None:
+            self.neighbors = None
+        else:
+            self.neighbors = NeighborCache(skin, num_neighbors=20)
+
+    def compute(self, box, points, orientations=None):
+        return num_liq(box, points, self.neighbors, self.dtype)
+
+
+@register_cv('num_liq_subsampled')
+class SubsampledNumLiquid(CollectiveVariable):
+    """
+    Cheap estimate of num_liq from a fixed random subset of the particles,
+    scaled to the whole system. Meant as a delayed-acceptance surrogate.
+    The subset is chosen by index, so points must come in a fixed order,
+    e.g. tag order as in a snapshot.
+    """
+    def __init__(self, fraction=0.1, seed=0):
+        super().__init__()
+        self.fraction = fraction
+        self._rng = np.random.default_rng(seed)
+        self._subset = None
+        self._N = 0
+
+    def compute(self, box, points, orientations=None):
+
+        N = len(points)
+        if N != self._N:
+            n = max(1, int(self.fraction*N))
+            self._subset = np.sort(self._rng.choice(N, n, replace=False))
+            self._N = N
+
+        ci = coordination(box, points, r_cut=2.0, num_neighbors=20, query_indices=self._subset)
+        return np.sum(liquid_like(ci))*N/len(self._subset)
+
+
+@register_cv('coordination')
+class MeanCoordination(CollectiveVariable):
+    """
+    Mean continuous coordination number, see order_parameters.coordination
+    """
+    def __init__(self, r_cut, num_neighbors=None, r_max=None, skin=None, dtype=np.float64):
+        super().__init__()
+        self.r_cut = r_cut
+        self.num_neighbors = num_neighbors
+        self.r_max = r_max
+        self.dtype = dtype
+        if skin is None:
+            self.neighbors = None
+        else:
+            self.neighbors = NeighborCache(skin, r_max=r_max, num_neighbors=num_neighbors)
+
+    def compute(self, box, points, orientations=None):
+
+        ci = coordination(box, points, self.r_cut, self.num_neighbors, self.r_max,
+                          self.neighbors, self.dtype)
+        return np.mean(ci)
+
+
+@register_cv('q6')
+class Steinhardt(CollectiveVariable):
+    """
+    Global averaged Steinhardt order Q_l over the num_neighbors nearest neighbors
+    """
+    def __init__(self, l=6, num_neighbors=6, skin=None):
+        super().__init__()
+        self.num_neighbors = num_neighbors
+        self._steinhardt = freud.order.Steinhardt(l=l, average=True)
+        if skin is None:
+            self.neighbors = None
+        else:
+            self.neighbors = NeighborCache(skin, num_neighbors=num_neighbors)
+
+    def compute(self, box, points, orientations=None):
+
+        if self.neighbors is None:
+            system = freud.AABBQuery(box, points)
+            args = {"num_neighbors": self.num_neighbors, "exclude_ii": True}
+            nlist = system.query(points, args).toNeighborList()
+        else:
+            # the cached neighbors need no spatial data structure
+            system = (box, points)
+            i, j, vectors, _ = self.neighbors.query(box, points)
+            nlist = freud.locality.NeighborList.from_arrays(len(points), len(points), i, j, vectors)
+
+        self._steinhardt.compute(system, neighbors=nlist)
+        return self._steinhardt.order
+
+
+@register_cv('nematic')
+class Nematic(CollectiveVariable):
+    """
+    Nematic order parameter S of the particle axis u, the largest eigenvalue
+    of Q = 3/2 <u u> - 1/2 I
+    """
+    uses_orientations = True
+
+    def __init__(self, u=(0, 0, 1)):
+        super().__init__()
+        self.u = np.asarray(u, dtype=np.float64)/np.linalg.norm(u)
+
+    def compute(self, box, points, orientations=None):
+        return self.compute_batch([box], None, np.asarray(orientations)[None])[0]
+
+    def compute_batch(self, boxes, points, orientations=None):
+
+        # rotate u by the unit quaternions (w, x, y, z)
+        q = np.asarray(orientations, dtype=np.float64)
+        w, v = q[..., :1], q[..., 1:]
+        t = 2*np.cross(v, self.u)
+        director = self.u + w*t + np.cross(v, t)
+
+        Q = 1.5*np.einsum('fni,fnj->fij', director, director)/director.shape[1] - 0.5*np.eye(3)
+        return np.linalg.eigvalsh(Q)[:, -1]
+
+
+@register_cv('largest_cluster')
+class LargestSolidCluster(CollectiveVariable):
+    """
+    Size of the largest cluster of solid-like particles. A particle is
+    solid-like when at least solid_threshold of its num_neighbors nearest
+    neighbors have a normalized q_l dot product above q_threshold (freud
+    SolidLiquid). Solid-like particles closer than cluster_cut are joined
+    with freud.cluster.Cluster.
+    """
+    def __init__(self, l=6, num_neighbors=12, q_threshold=0.7, solid_threshold=6, cluster_cut=1.5):
+        super().__init__()
+        self.num_neighbors = num_neighbors
+        self.solid_threshold = solid_threshold
+        self.cluster_cut = cluster_cut
+        self._solid = freud.order.SolidLiquid(l=l, q_threshold=q_threshold,
+                                              solid_threshold=solid_threshold)
+        self._cluster = freud.cluster.Cluster()
+
+    def compute(self, box, points, orientations=None):
+
+        points = np.asarray(points, dtype=np.float32)
+        system = freud.AABBQuery(box, points)
+        args = {"num_neighbors": self.num_neighbors, "exclude_ii": True}
+        self._solid.compute(system, neighbors=args)
+
+        solid = self._solid.num_connections >= self.solid_threshold
+        if not np.any(solid):
+            return 0.
+
+        self._cluster.compute((box, points[solid]), neighbors={"r_max": self.cluster_cut})
+        return float(np.max(np.bincount(self._cluster.cluster_idx)))
+
+
+@register_cv('dihedral')
+class Dihedral(CollectiveVariable):
+    """
+    Dihedral angle in degrees of one quadruplet of particle indices
+    """
+    def __init__(self, indices):
+        super().__init__()
+        self.indices = np.asarray(indices)
+
+    def compute(self, box, points, orientations=None):
+
+        box = freud.box.Box.from_box(box)
+        boxes = [[box.Lx, box.Ly, box.Lz, box.xy, box.xz, box.yz]]
+        return self.compute_batch(boxes, np.asarray(points)[None])[0]
+
+    def compute_batch(self, boxes, points, orientations=None):
+
+        p = np.asarray(points, dtype=np.float64)[:, self.indices]
+        b = p[:, 1:]-p[:, :-1]
+
+        # minimum image of the bond vectors in the box matrices of all frames
+        Lx, Ly, Lz, xy, xz, yz = np.asarray(boxes, dtype=np.float64).T
+        H = np.zeros((len(Lx), 3, 3))
+        H[:, 0, 0], H[:, 0, 1], H[:, 0, 2] = Lx, xy*Ly, xz*Lz
+        H[:, 1, 1], H[:, 1, 2] = Ly, yz*Lz
+        # 2D boxes have Lz = 0 and no extent in z to wrap
+        H[:, 2, 2] = np.where(Lz > 0, Lz, 1)
+        frac = np.linalg.solve(H[:, None], b[..., None])[..., 0]
+        frac[..., 2] *= Lz[:, None] > 0
+        b = np.einsum('fij,fkj->fki', H, frac-np.round(frac))
+
+        b0, b1, b2 = -b[:, 0], b[:, 1], b[:, 2]
+        b0xb1 = np.cross(b0, b1)
+        b1xb2 = np.cross(b2, b1)
+
+        y = np.einsum('fi,fi->f', np.cross(b0xb1, b1xb2), b1)/np.linalg.norm(b1, axis=1)
+        x = np.einsum('fi,fi->f', b0xb1, b1xb2)
+
+        return np.degrees(np.arctan2(y, x))
@@ -0,0 +1,77 @@
+import os
+import sys
+import numpy as np
+
+import gsd.fl
+
+# the columnar log reader of md/hexbp
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'md', 'hexbp'))
+from logreader import read_log
+
+
+def iter_log(filename, keys, chunk=10000, start=0, stop=None):
+    """
+    Yield dicts of arrays holding up to chunk frames of the given log
+    quantities, e.g. 'metad/WTmetadUpdater/op', read with logreader.read_log.
+    Only the log chunks are read from the GSD file, particle data is never
+    decoded, and frames missing a chunk take its value from frame 0.
+    """
+    with gsd.fl.open(name=filename, mode='r') as f:
+        stop = f.nframes if stop is None else min(stop, f.nframes)
+    for lo in range(start, stop, chunk):
+        yield read_log(filename, keys, frames=slice(lo, min(lo+chunk, stop)), cache=False)
+
+def free_energy(filename, op_key, bins, vbias_key=None, ebetac_key=None, kT=1.0,
+                n_blocks=10, chunk=10000, start=0, stop=None):
+    """
+    Free energy along a logged order parameter, read chunk by chunk so memory
+    does not grow with the number of frames.
+
+    With vbias_key (and optionally ebetac_key) every frame is reweighted by
+    exp(vbias)/ebetac as in well-tempered metadynamics; vbias is in units of
+    kT as logged by the metadynamics updaters. The frames are split into
+    n_blocks contiguous blocks and the error bar is the standard error of the
+    block probabilities propagated to the free energy.
+
+    Returns bin centers, free energy (minimum set to zero) and error.
+    """
+    bins = np.asarray(bins, dtype=np.float64)
+    with gsd.fl.open(name=filename, mode='r') as f:
+        nframes = f.nframes if stop is None else min(stop, f.nframes)
+    nframes -= start
+
+    keys = [k for k in (op_key, vbias_key, ebetac_key) if k is not None]
+    hist = np.zeros((n_blocks, len(bins)-1))
+    # log weights are shifted by their running maximum to avoid overflow
+    shift = -np.inf
+
+    frame = 0
+    for log in iter_log(filename, keys, chunk, start, start+nframes):
+        op = log[op_key]
+        logw = np.zeros(len(op))
+        if vbias_key is not None:
+            logw += log[vbias_key]
+        if ebetac_key is not None:
+            logw -= np.log(log[ebetac_key])
+
+        if logw.max() > shift:
+            hist *= np.exp(shift-logw.max())
+            shift = logw.max()
+
+        block = (frame+np.arange(len(op)))*n_blocks//nframes
+        idx = np.digitize(op, bins)-1
+        inside = (idx >= 0) & (idx < len(bins)-1)
+        np.add.at(hist, (block[inside], idx[inside]), np.exp(logw[inside]-shift))
+        frame += len(op)
+
+    prob = hist.sum(axis=0)/hist.sum()
+    prob_blocks = hist/np.maximum(hist.sum(axis=1, keepdims=True), 1e-300)
+    err_prob = np.std(prob_blocks, axis=0, ddof=1)/np.sqrt(n_blocks)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fes = -kT*np.log(prob)
+        err = kT*err_prob/prob
+    fes -= np.min(fes[np.isfinite(fes)])
+
+    centers = 0.5*(bins[1:]+bins[:-1])
+    return centers, fes, err
@@ -7,7 +7,9 @@ import numpy as np
 import hoomd
 import gsd.hoomd
 
-from order_parameters import compute_num_liq as compute_op
+from colvars import make_cv, NumLiquid
+from bias import HillBias, GridBias
+from checkpoint import rng_to_array, rng_from_array, read_checkpoint
 
 class CustomAction(hoomd.custom.Action):
     """This custom Action class extends the Action class' functionality to
@@ -27,10 +29,14 @@ class CustomAction(hoomd.custom.Action):
 
 class WTmetadUpdater(CustomAction):
     """
-    Custom alchemical updater for HPMC integrator. This updater performs trial moves on alchemical
-    parameters.
+    Well-tempered metadynamics updater for HPMC. After each HPMC step the
+    new configuration is accepted with the bias on the collective variable
+    cv (num_liq by default) or rolled back, and a hill is deposited every
+    stride steps. The options are described in the README.
     """
-    def __init__(self, rng, h0, sigma, T, dT, stride, calc_ebetac=True):
+    def __init__(self, rng, h0, sigma, T, dT, stride, calc_ebetac=True, grid=None, ebetac_every=1,
+                 inplace_rollback=False, skin=None, walkers=None, sync_every=None,
+                 cv=None, surrogate=None):
         super().__init__()
         self._counters = [0, 0]
         self._rng = rng
@@ -42,76 +48,232 @@ class WTmetadUpdater(CustomAction):
         self.bias_factor = (T+dT)/T
         
         self.current_op = 0.
-        self.op_bias_arr = []
-        self.hbias_arr = []
+        if grid is None:
+            self.bias = HillBias(sigma)
+        else:
+            self.bias = GridBias(sigma, *grid)
         self.current_vbias = 0.
         self.current_ebetac = 0.
         
         self.calc_ebetac = calc_ebetac
+        self.ebetac_every = ebetac_every
+        self._ebetac_hills = 0
+        
+        self.inplace_rollback = inplace_rollback
+        if cv is None:
+            self.cv = NumLiquid(skin)
+        elif isinstance(cv, str):
+            self.cv = make_cv(cv)
+        else:
+            self.cv = cv
+        
+        if isinstance(surrogate, str):
+            surrogate = make_cv(surrogate)
+        self.surrogate = surrogate
+        self._da_counters = [0, 0]
+        
+        self.walkers = walkers
+        self.sync_every = stride if sync_every is None else sync_every
         
     def set_init_snapshot(self, snap):
-        self.prev = snap
         
-    def compute_vbias(self, op):
+        self._prev_op = self.compute_op(snap.configuration.box, snap.particles.position,
+                                        snap.particles.orientation)
+        if self.surrogate is not None:
+            self._prev_sop = self.surrogate(snap.configuration.box, snap.particles.position,
+                                            snap.particles.orientation)
+        if not self.inplace_rollback:
+            self.prev = snap
+            return
+        
+        # snapshot particles are in tag order
+        self.prev = None
+        self._prev_pos = np.array(snap.particles.position, dtype=np.float64)
+        self._prev_ori = np.array(snap.particles.orientation, dtype=np.float64)
+        self._prev_image = np.array(snap.particles.image, dtype=np.int32)
         
-        op = np.asarray(op)
-        dop = op-self.op_bias_arr
-        vbias = self.hbias_arr * np.exp(-0.5*dop**2/self.sigma**2)
-        vbias_tot = np.sum(vbias)
+        # scratch arrays filled in place every step: tags and the tag-order
+        # configuration seen by the cvs, and the local-order rollback state
+        N = len(self._prev_pos)
+        self._tag = np.empty(N, dtype=np.intp)
+        self._points = np.empty((N, 3))
+        self._orientations = np.empty((N, 4))
+        self._local_pos = np.empty((N, 3))
+        self._local_ori = np.empty((N, 4))
+        self._local_image = np.empty((N, 3), dtype=np.int32)
         
-        return vbias_tot
+    def compute_op(self, box, points, orientations=None):
+        
+        return self.cv(box, points, orientations)
+        
+    def compute_vbias(self, op):
+        
+        return self.bias(op)
 
     def compute_ebetac(self):
-
-        if not self.calc_ebetac or len(self.op_bias_arr)==0:
+        """
+        ebetac of the current bias. The bias only changes when a hill is
+        deposited, so it is recomputed only every ebetac_every hills.
+        """
+        if not self.calc_ebetac or self.bias.n_hills==0:
             return 1
+
+        # the bias only changes when a hill is deposited, so keep the cached
+        # value until ebetac_every new hills have been added. It is always
+        # computed for the first hill, so it is never logged as 0.
+        if self._ebetac_hills > 0 and self.bias.n_hills-self._ebetac_hills < self.ebetac_every:
+            return self.current_ebetac
+        self._ebetac_hills = self.bias.n_hills
         
         gamma = self.bias_factor
         # ds will be cancelled out.
         # set up integration space for betav
-        min_op = min(self.op_bias_arr)
-        max_op = max(self.op_bias_arr)
+        min_op, max_op = self.bias.op_range()
         interval_op = (max_op-min_op)/100
         op_space = min_op + np.arange(100) * interval_op
         
-        betav = np.array([self.compute_vbias(op_i) for op_i in op_space])
+        betav = self.compute_vbias(op_space)
         num = np.sum(np.exp(gamma/(gamma-1) * betav))
         den = np.sum(np.exp(1/(gamma-1) * betav))
         ebetac = num/den
 
         return ebetac
+    
+    def restore_checkpoint(self, filename, frame=-1):
+        """
+        Continue a run from the checkpoint_* quantities logged to filename.
+        Call it on an updater built with the same parameters, before
+        set_init_snapshot.
+        """
+        checkpoint = read_checkpoint(filename, self, frame)
+        state = checkpoint['state']
+        self._counters = [int(state[0]), int(state[1])]
+        self.current_op = state[2]
+        self.current_vbias = state[3]
+        self.current_ebetac = state[4]
+        self._ebetac_hills = int(state[5])
+        if self.current_ebetac <= 0:
+            # no valid cached value, recompute at the next step
+            self._ebetac_hills = 0
+        if self.walkers is not None:
+            self.walkers.restore(int(state[6]))
+        self.bias.from_array(checkpoint['bias'])
+        rng_from_array(self._rng, checkpoint['rng'])
         
     def act(self, timestep):
         
-        # before HPMC trial move
-        prev_op = compute_op(self.prev)
-        prev_vbias = self.compute_vbias(prev_op)
+        if self.inplace_rollback:
+            self._inplace_move()
+        else:
+            self._snapshot_move()
+        
+        self.current_ebetac = self.compute_ebetac()
+        if timestep%self.stride==0:
+            current_hbias = self.h0 * np.exp(-self.current_vbias/self.dT)
+            self.bias.deposit(self.current_op, current_hbias)
+            if self.walkers is not None:
+                self.walkers.append(self.current_op, current_hbias)
+        
+        if self.walkers is not None and timestep%self.sync_every==0:
+            self.walkers.sync(self.bias)
+    
+    def _bias_acceptance(self, box, points, orientations):
+        """
+        Biased acceptance of the configuration after the HPMC trial move.
+        Returns whether it is accepted, and the op and vbias of the trial and
+        of the previous state.
 
+        With a surrogate the move is first screened with the bias at the
+        surrogate op, exp(-(Vs(trial)-Vs(prev))), and cv is evaluated only if
+        it passes. The second stage divides that factor out again, which
+        keeps detailed balance with respect to the exact bias.
+        """
+        # before HPMC trial move, the previous state keeps its op
+        prev_vbias = self.compute_vbias(self._prev_op)
+        
+        dvs = 0.
+        if self.surrogate is not None:
+            self._trial_sop = self.surrogate(box, points, orientations)
+            dvs = self.compute_vbias(self._trial_sop)-self.compute_vbias(self._prev_sop)
+            if self._rng.random() >= np.exp(-dvs):
+                # rejected by the surrogate, cv is not evaluated
+                self._da_counters[0] += 1
+                return False, None, None, prev_vbias
+            self._da_counters[1] += 1
+        
         # after HPMC trial move
-        trial = self._sim.state.get_snapshot()
-        trial_op = compute_op(trial)
+        trial_op = self.compute_op(box, points, orientations)
         trial_vbias = self.compute_vbias(trial_op)
 
-        pbias = np.exp(-(trial_vbias-prev_vbias)) # beta in HPMC default to be 1
+        pbias = np.exp(-(trial_vbias-prev_vbias)+dvs) # beta in HPMC default to be 1
+        
+        return self._rng.random() < pbias, trial_op, trial_vbias, prev_vbias
+    
+    def _accept(self, trial_op, trial_vbias):
+        
+        self._prev_op = trial_op
+        if self.surrogate is not None:
+            self._prev_sop = self._trial_sop
+        self._counters[0] += 1
+        self.current_op = trial_op
+        self.current_vbias = trial_vbias
+    
+    def _snapshot_move(self):
+        
+        trial = self._sim.state.get_snapshot()
+        accepted, trial_op, trial_vbias, prev_vbias = self._bias_acceptance(
+            trial.configuration.box, trial.particles.position, trial.particles.orientation)
         
-        if  self._rng.random() < pbias:
+        if accepted:
             # move was accepted
             self.prev = trial
-            self._counters[0] += 1
-            self.current_op = trial_op
-            self.current_vbias = trial_vbias
+            self._accept(trial_op, trial_vbias)
             
         else:
             # move was rejected
             self._sim.state.set_snapshot(self.prev)
             self._counters[1] += 1
             self.current_vbias = prev_vbias
-        
-        self.current_ebetac = self.compute_ebetac()
-        if timestep%self.stride==0:
-            self.op_bias_arr.append(self.current_op)
-            current_hbias = self.h0 * np.exp(-self.current_vbias/self.dT)
-            self.hbias_arr.append(current_hbias)
+    
+    def _inplace_move(self):
+        """
+        Undo a rejected move in place through cpu_local_snapshot, from
+        arrays indexed by tag, instead of copying snapshots. Single MPI rank.
+        """
+        with self._sim.state.cpu_local_snapshot as snap:
+            particles = snap.particles
+            tag = self._tag
+            np.copyto(tag, particles.tag)
+            
+            # the cvs see particles in tag order, as in a snapshot, so the
+            # surrogate subset and the neighbor cache do not change when
+            # HOOMD re-sorts its local arrays
+            points = self._points
+            points[tag] = particles.position
+            orientations = None
+            if self.cv.uses_orientations or getattr(self.surrogate, 'uses_orientations', False):
+                orientations = self._orientations
+                orientations[tag] = particles.orientation
+            accepted, trial_op, trial_vbias, prev_vbias = self._bias_acceptance(
+                snap.global_box, points, orientations)
+            
+            if accepted:
+                # move was accepted
+                self._prev_pos[:] = points
+                if orientations is None:
+                    self._prev_ori[tag] = particles.orientation
+                else:
+                    self._prev_ori[:] = orientations
+                self._prev_image[tag] = particles.image
+                self._accept(trial_op, trial_vbias)
+                
+            else:
+                # move was rejected
+                particles.position[:] = np.take(self._prev_pos, tag, axis=0, out=self._local_pos)
+                particles.orientation[:] = np.take(self._prev_ori, tag, axis=0, out=self._local_ori)
+                particles.image[:] = np.take(self._prev_image, tag, axis=0, out=self._local_image)
+                self._counters[1] += 1
+                self.current_vbias = prev_vbias
             
             
     @hoomd.logging.log(category='scalar', requires_run=True)
@@ -126,7 +288,28 @@ class WTmetadUpdater(CustomAction):
     def ebetac(self):
         return self.current_ebetac
         
+    @hoomd.logging.log(category='scalar', requires_run=True)
+    def cv_time(self):
+        return self.cv.time_per_call
+        
     @hoomd.logging.log(category='sequence', requires_run=True)
     def bias_moves(self):
         return tuple(self._counters)
-    
\ No newline at end of file
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def delayed_moves(self):
+        return tuple(self._da_counters)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_state(self):
+        return np.array([*self._counters, self.current_op, self.current_vbias,
+                         self.current_ebetac, self._ebetac_hills,
+                         0 if self.walkers is None else self.walkers.offset], dtype=np.float64)
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_bias(self):
+        return self.bias.to_array()
+    
+    @hoomd.logging.log(category='sequence', requires_run=True)
+    def checkpoint_rng(self):
+        return rng_to_array(self._rng)
@@ -1,40 +1,222 @@
 import numpy as np
 import freud
 
+
+def minimum_image(box, vectors):
+    """
+    Wrap difference vectors (..., 3) into the freud box by rounding their
+    fractional coordinates, as box.wrap but without its per-call overhead
+    on large arrays. 2D boxes are left to box.wrap.
+    """
+    if box.is2D:
+        return box.wrap(vectors.reshape(-1, 3)).reshape(vectors.shape)
+    H = box.to_matrix().astype(vectors.dtype)
+    if not (box.xy or box.xz or box.yz):
+        L = np.diag(H)
+        return vectors-L*np.round(vectors/L)
+    frac = vectors @ np.linalg.inv(H).T
+    return (frac-np.round(frac)) @ H.T
+
+
+class NeighborCache:
+    """
+    Verlet-skin neighbor list for order parameters evaluated every step.
+    Candidate neighbors are found with freud and kept between calls in a
+    padded (N, M) array; they are rebuilt only when the box or the number of
+    particles changes, or once a particle has moved more than half the skin
+    since the last build. In between, only the distances of the candidates
+    are recomputed.
+
+    Give either r_max (all pairs closer than r_max) or num_neighbors (the k
+    nearest neighbors of each particle). In the latter case the candidates of
+    each particle reach 2*skin past its own k-th neighbor at build time,
+    which keeps the k nearest neighbors exact under the same rebuild
+    criterion, and the k nearest are picked row by row with argpartition.
+    """
+    def __init__(self, skin, r_max=None, num_neighbors=None):
+        self.skin = skin
+        self.r_max = r_max
+        self.num_neighbors = num_neighbors
+        self.n_builds = 0
+        self._box = None
+        self._ref = None
+
+    def _needs_rebuild(self, box, points):
+
+        if self._ref is None or len(points) != len(self._ref) or box != self._box:
+            return True
+
+        dr = box.wrap(points-self._ref)
+        return np.max(np.sum(dr**2, axis=1)) > (0.5*self.skin)**2
+
+    def _candidates(self, system, points):
+        """
+        Pairs (i, j) within the radius of i, its k-th neighbor distance plus
+        2*skin. The radii differ between particles, e.g. in a droplet and its
+        vapor, so particles are queried in groups of similar radius, each
+        group out to its own largest radius.
+        """
+        N = len(points)
+        k = self.num_neighbors
+        args = {"num_neighbors": k, "exclude_ii": True}
+        nlist = system.query(points, args).toNeighborList()
+        radius = nlist.distances.reshape(N, k).max(axis=1)+2*self.skin
+
+        # radii within 10% share a query, so at most ~1.3x extra pairs are filtered out
+        group = np.floor(np.log(radius/radius.min())/np.log(1.1)).astype(np.int64)
+        order = np.argsort(group, kind='stable')
+        bounds = np.flatnonzero(np.diff(group[order]))+1
+        i, j = [], []
+        for query in np.split(order, bounds):
+            nlist = system.query(points[query], {"r_max": radius[query].max()}).toNeighborList()
+            qi = query[nlist.query_point_indices]
+            pj = nlist.point_indices
+            keep = (nlist.distances <= radius[qi]) & (pj != qi)
+            i.append(qi[keep])
+            j.append(pj[keep])
+
+        return np.concatenate(i), np.concatenate(j)
+
+    def _rebuild(self, box, points):
+
+        N = len(points)
+        system = freud.AABBQuery(box, points)
+        if self.num_neighbors is None:
+            args = {"r_max": self.r_max+self.skin, "exclude_ii": True}
+            nlist = system.query(points, args).toNeighborList()
+            i, j = nlist.query_point_indices, nlist.point_indices
+        else:
+            i, j = self._candidates(system, points)
+
+        # pad every row to the largest number of candidates with the
+        # particle itself, masked out by _valid
+        order = np.argsort(i, kind='stable')
+        i, j = i[order], j[order]
+        counts = np.bincount(i, minlength=N)
+        col = np.arange(len(i))-(np.cumsum(counts)-counts)[i]
+        self._j = np.repeat(np.arange(N)[:, None], max(counts.max(), 1), axis=1)
+        self._j[i, col] = j
+        self._valid = np.zeros(self._j.shape, dtype=bool)
+        self._valid[i, col] = True
+
+        self._box = box
+        self._ref = points.copy()
+        self.n_builds += 1
+
+    def query(self, box, points):
+        """
+        Return query point indices, point indices, bond vectors and distances
+        of the current neighbors, sorted by query point index as in freud.
+        """
+        box = freud.box.Box.from_box(box)
+        points = np.asarray(points, dtype=np.float32)
+        if self._needs_rebuild(box, points):
+            self._rebuild(box, points)
+
+        N = len(points)
+        vectors = minimum_image(box, points[self._j]-points[:, None])
+        d2 = np.einsum('ijk,ijk->ij', vectors, vectors)
+        d2[~self._valid] = np.inf
+
+        if self.num_neighbors is None:
+            rows, cols = np.nonzero(d2 < self.r_max**2)
+        else:
+            k = self.num_neighbors
+            cols = np.argpartition(d2, k-1, axis=1)[:, :k].ravel()
+            rows = np.repeat(np.arange(N), k)
+
+        vectors = vectors[rows, cols]
+        return rows, self._j[rows, cols], vectors, np.sqrt(d2[rows, cols])
+
+
 qc = freud.order.Steinhardt(l=6, average=True)
-def compute_qc(snapshot):
+def compute_qc(snapshot, neighbors=None):
     """
     Q_l
+
+    neighbors is an optional NeighborCache with num_neighbors=6.
     """
     box = snapshot.configuration.box
     points = snapshot.particles.position
 
-    system = freud.AABBQuery(box, points)
-    args = {"num_neighbors": 6, "exclude_ii": True}
-    nlist = system.query(points, args).toNeighborList()
+    if neighbors is None:
+        system = freud.AABBQuery(box, points)
+        args = {"num_neighbors": 6, "exclude_ii": True}
+        nlist = system.query(points, args).toNeighborList()
+    else:
+        # the cached neighbors need no spatial data structure
+        system = (box, points)
+        i, j, vectors, _ = neighbors.query(box, points)
+        nlist = freud.locality.NeighborList.from_arrays(len(points), len(points), i, j, vectors)
 
     qc.compute(system, neighbors=nlist)
     return qc.order
 
-def compute_num_liq(snapshot):
+def coordination(box, points, r_cut, num_neighbors=None, r_max=None, neighbors=None,
+                 dtype=np.float64, query_indices=None):
+    """
+    Continuous coordination number c_i = sum_j s(r_ij) with the switching
+    function s(r) = (1-(r/r_cut)^6)/(1-(r/r_cut)^12) = 1/(1+(r/r_cut)^6).
+
+    Neighbors are the num_neighbors nearest, all pairs within r_max, or come
+    from a NeighborCache. The per-particle sums are segment sums over the
+    neighbor list, so particles may have different numbers of neighbors.
+    dtype=np.float32 evaluates the switching function in single precision.
+    With query_indices only those particles are evaluated, in that order.
+    """
+    if query_indices is not None:
+        points = np.asarray(points, dtype=np.float32)
+        system = freud.AABBQuery(box, points)
+        # the query points are a subset, so drop the self pairs by index
+        if num_neighbors is not None:
+            args = {"num_neighbors": num_neighbors+1}
+        else:
+            args = {"r_max": r_max}
+        nlist = system.query(points[query_indices], args).toNeighborList()
+        not_self = nlist.point_indices != query_indices[nlist.query_point_indices]
+        i = nlist.query_point_indices[not_self]
+        distances = nlist.distances[not_self]
+        points = query_indices
+    elif neighbors is not None:
+        i, _, _, distances = neighbors.query(box, points)
+    else:
+        system = freud.AABBQuery(box, points)
+        if num_neighbors is not None:
+            args = {"num_neighbors": num_neighbors, "exclude_ii": True}
+        else:
+            args = {"r_max": r_max, "exclude_ii": True}
+        nlist = system.query(points, args).toNeighborList()
+        i, distances = nlist.query_point_indices, nlist.distances
+
+    d6 = (np.asarray(distances, dtype=dtype)/dtype(r_cut))**6
+    cij = 1/(1+d6)
+
+    return np.bincount(i, weights=cij, minlength=len(points))
+
+def compute_num_liq(snapshot, neighbors=None, dtype=np.float64):
     """
     Contiuous number of liquids
     """
-    r_cut = 2.0
     box = snapshot.configuration.box
     points = snapshot.particles.position
 
-    system = freud.AABBQuery(box, points)
-    args = {"num_neighbors": 20, "exclude_ii": True}
-    nlist = system.query(points, args).toNeighborList()
-    d6 = (nlist.distances.reshape(20,-1)/r_cut)**6
-    d12 = d6**2
-    cij = (1-d6)/(1-d12+1e-10)
-    ci = np.sum(cij, axis=0)
-    
-    c_l = 5
-    clci6 = (c_l/ci)**6
-    clci12 = clci6**2
-
-    num_liq = np.sum( (1-clci6)/(1-clci12) )
-    return num_liq
\ No newline at end of file
+    return num_liq(box, points, neighbors, dtype)
+
+def num_liq(box, points, neighbors=None, dtype=np.float64):
+    """
+    Contiuous number of liquids from a box and an array of positions
+
+    neighbors is an optional NeighborCache with num_neighbors=20.
+    """
+    ci = coordination(box, points, r_cut=2.0, num_neighbors=20, neighbors=neighbors, dtype=dtype)
+
+    num_liq = np.sum(liquid_like(ci))
+    return num_liq
+
+def liquid_like(ci, c_l=5):
+    """
+    Per-particle switching of the coordination number,
+    (1-(c_l/c_i)^6)/(1-(c_l/c_i)^12), written to stay finite at c_i = c_l
+    """
+    cicl6 = (ci/c_l)**6
+    return cicl6/(1+cicl6)
@@ -0,0 +1,74 @@
+import os
+import fcntl
+import numpy as np
+
+
+hill_dtype = np.dtype([('walker', np.int64), ('op', np.float64), ('h', np.float64)])
+
+class SharedHills:
+    """
+    Append-only binary file of hills shared by several metadynamics walkers on
+    the same machine. Every walker appends the hills it deposits under an
+    exclusive file lock and periodically reads the records the other walkers
+    have appended since its last read, so each walker sees all hills within
+    one sync interval.
+
+    reset=True empties the file, e.g. for walker 0 when a new run starts,
+    before the other walkers are launched. Otherwise hills already in the
+    file are read as well, so a walker that finds hills of its own walker_id
+    it did not append, left over from an earlier run, raises ValueError
+    unless its read offset was restored from a checkpoint.
+    """
+    def __init__(self, filename, walker_id, reset=False):
+        self.filename = filename
+        self.walker_id = walker_id
+        self.offset = 0
+        self._restored = False
+        self._n_appended = 0
+        self._n_own_read = 0
+        # make sure the file exists before any walker reads it
+        with open(self.filename, 'wb' if reset else 'ab'):
+            pass
+
+    def restore(self, offset):
+        """
+        Continue reading at offset, the read position saved in a checkpoint.
+        """
+        self.offset = offset
+        self._restored = True
+
+    def append(self, op, h):
+
+        record = np.array([(self.walker_id, op, h)], dtype=hill_dtype)
+        with open(self.filename, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(record.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            fcntl.flock(f, fcntl.LOCK_UN)
+        self._n_appended += 1
+
+    def sync(self, bias):
+        """
+        Deposit the hills of the other walkers appended since the last sync
+        into bias. Returns the number of hills added.
+        """
+        with open(self.filename, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            f.seek(self.offset)
+            data = f.read()
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+        n = len(data)//hill_dtype.itemsize
+        self.offset += n*hill_dtype.itemsize
+        records = np.frombuffer(data[:n*hill_dtype.itemsize], dtype=hill_dtype)
+        own = records['walker'] == self.walker_id
+        self._n_own_read += np.count_nonzero(own)
+        if not self._restored and self._n_own_read > self._n_appended:
+            raise ValueError(f"{self.filename} holds hills of walker {self.walker_id} from an "
+                             "earlier run; pass reset=True to start a new run or restore a checkpoint")
+        records = records[~own]
+        for op, h in zip(records['op'], records['h']):
+            bias.deposit(op, h)
+
+        return len(records)
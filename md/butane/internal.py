@@ -0,0 +1,113 @@
+import numpy as np
+import gsd.fl
+
+
+def minimum_image(d, boxes):
+    """
+    Wrap difference vectors d of shape (F, M, 3) into the boxes (F, 6) given
+    as (Lx, Ly, Lz, xy, xz, yz), one box per frame, triclinic boxes included.
+    Same convention as hoomd's minimum image, exact for vectors shorter than
+    half the box, e.g. within a molecule.
+    """
+    d = np.array(d, dtype=np.float64)
+    Lx, Ly, Lz, xy, xz, yz = (boxes[:, k, None] for k in range(6))
+
+    # remove lattice vectors from the last box vector to the first
+    if np.any(Lz != 0):
+        n = np.round(d[..., 2]/np.where(Lz != 0, Lz, 1))
+        d[..., 0] -= n*xz*Lz
+        d[..., 1] -= n*yz*Lz
+        d[..., 2] -= n*Lz
+    n = np.round(d[..., 1]/Ly)
+    d[..., 0] -= n*xy*Ly
+    d[..., 1] -= n*Ly
+    d[..., 0] -= np.round(d[..., 0]/Lx)*Lx
+
+    return d
+
+
+def bond_lengths(positions, boxes, group):
+    """
+    Lengths of the bonds in group (M, 2) for positions (F, N, 3), shape (F, M)
+    """
+    b = minimum_image(positions[:, group[:, 1]]-positions[:, group[:, 0]], boxes)
+    return np.linalg.norm(b, axis=-1)
+
+
+def angles(positions, boxes, group):
+    """
+    Angles in degrees at the middle particle of group (M, 3), shape (F, M)
+    """
+    a = minimum_image(positions[:, group[:, 0]]-positions[:, group[:, 1]], boxes)
+    b = minimum_image(positions[:, group[:, 2]]-positions[:, group[:, 1]], boxes)
+
+    cos = np.sum(a*b, axis=-1)/(np.linalg.norm(a, axis=-1)*np.linalg.norm(b, axis=-1))
+    return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+
+def dihedrals(positions, boxes, group):
+    """
+    Dihedral angles in degrees of group (M, 4), shape (F, M). Same formula
+    and sign convention as dihedral() in dihedral.ipynb.
+    """
+    p = [positions[:, group[:, k]] for k in range(4)]
+    b0 = -minimum_image(p[1]-p[0], boxes)
+    b1 = minimum_image(p[2]-p[1], boxes)
+    b2 = minimum_image(p[3]-p[2], boxes)
+
+    b0xb1 = np.cross(b0, b1)
+    b1xb2 = np.cross(b2, b1)
+
+    y = np.sum(np.cross(b0xb1, b1xb2)*b1, axis=-1)/np.linalg.norm(b1, axis=-1)
+    x = np.sum(b0xb1*b1xb2, axis=-1)
+
+    return np.degrees(np.arctan2(y, x))
+
+
+_kinds = {'bonds': bond_lengths, 'angles': angles, 'dihedrals': dihedrals}
+
+
+def _read(f, frame, name):
+    # gsd.hoomd falls back to frame 0 for chunks missing in a frame
+    if not f.chunk_exists(frame=frame, name=name):
+        frame = 0
+    return f.read_chunk(frame=frame, name=name)
+
+
+def _types(f, name):
+    return [bytes(row).decode().rstrip('\x00') for row in _read(f, 0, name)]
+
+
+def internal_coordinates(filename, kinds=('bonds', 'angles', 'dihedrals'), frames=slice(None),
+                         block=1000):
+    """
+    Bond lengths, angles and dihedrals (degrees) of every group in the
+    topology of a gsd trajectory over all frames, with minimum image
+    distances. Positions are read from the file a block of frames at a time
+    and every block is evaluated for all groups at once.
+
+    Returns values and names, dicts over kinds: values[kind] has shape
+    (frames, groups) and names[kind] is the type name of each group, so e.g.
+    values['dihedrals'][:, names['dihedrals']=='CCCC'] selects a type.
+    """
+    values = {kind: [] for kind in kinds}
+    names = {}
+
+    with gsd.fl.open(name=filename, mode='r') as f:
+        groups = {}
+        for kind in kinds:
+            groups[kind] = _read(f, 0, f'{kind}/group').astype(np.int64)
+            typeid = _read(f, 0, f'{kind}/typeid')
+            names[kind] = np.array(_types(f, f'{kind}/types'))[typeid]
+
+        indices = range(f.nframes)[frames]
+        for lo in range(0, len(indices), block):
+            chunk = indices[lo:lo+block]
+            positions = np.array([_read(f, i, 'particles/position') for i in chunk], dtype=np.float64)
+            boxes = np.array([_read(f, i, 'configuration/box') for i in chunk], dtype=np.float64)
+            for kind in kinds:
+                values[kind].append(_kinds[kind](positions, boxes, groups[kind]))
+
+    values = {kind: np.concatenate(v) if v else np.zeros((0, len(groups[kind])))
+              for kind, v in values.items()}
+    return values, names
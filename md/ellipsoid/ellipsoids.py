@@ -6,7 +6,6 @@ import matplotlib
 import math
 import numpy as np
 import datetime
-import itertools
 import freud
 import warnings
 import fresnel
@@ -14,6 +13,9 @@ import IPython
 import packaging.version
 import coxeter
 
+from lattice import lattice_snapshot
+from trajectory import tiered_writers
+
 
 elle = coxeter.shapes.Ellipsoid(1.5, 0.5, 0.5)
 sigma = elle.maximal_bounded_sphere_radius * 2
@@ -21,34 +23,6 @@ moment_inertia = elle.inertia_tensor.diagonal()
 
 N = 10
 spacing = 4.0
-K = math.ceil(N**(1 / 3))
-L = K * spacing
-x = np.linspace(-L / 2, L / 2, K, endpoint=False)
-position = list(itertools.product(x, repeat=3))
-print(position[0:4])
-
-position = position[0:N]
-orientation = [(1, 0, 0, 0)] * N
-
-snapshot = gsd.hoomd.Snapshot()
-snapshot.particles.N = N
-snapshot.particles.position = position
-snapshot.particles.orientation = orientation
-snapshot.particles.moment_inertia = [moment_inertia] * N
-s
-snapshot.particles.typeid = [0] * N
-snapshot.particles.types = ['A']
-snapshot.configuration.box = [L, L, L, 0, 0, 0]
-
-initial_snapshot = snapshot
-
-
-with gsd.hoomd.open(name='initial_lattice_ellipsoids.gsd', mode='wb') as f:
-    f.append(snapshot)
-
-    
-    
-    
 
     
 dt = 0.0005
@@ -58,7 +32,9 @@ tauS = 1000*dt
     
 cpu = hoomd.device.CPU()
 sim = hoomd.Simulation(device=cpu, seed=1)
-sim.create_state_from_gsd(filename='initial_lattice_ellipsoids.gsd')
+snapshot = lattice_snapshot(N, spacing, kind='sc', moment_inertia=moment_inertia,
+                            communicator=cpu.communicator)
+sim.create_state_from_snapshot(snapshot)
 sim.state.thermalize_particle_momenta(filter=hoomd.filter.All(), kT=1.0)
     
 nl = hoomd.md.nlist.Cell(buffer=0.4)
@@ -91,16 +67,12 @@ sim.operations.integrator = integrator
 
 sim.run(0)
 
-logger = hoomd.logging.Logger()
-logger.add(alj, quantities=['type_shapes'])
 thermodynamic_properties = hoomd.md.compute.ThermodynamicQuantities(filter=hoomd.filter.All())
-logger.add(thermodynamic_properties)
-    
-gsd_writer = hoomd.write.GSD(filename='trajectory_ellipsoids.gsd',
-                             trigger=hoomd.trigger.Periodic(10),
-                             mode='wb',
-                             filter=hoomd.filter.All(),
-                             log=logger)
-sim.operations.writers.append(gsd_writer)
+sim.operations.computes.append(thermodynamic_properties)
+
+# scalar logs every 10 steps, configurations every 1000, the shape once
+for writer in tiered_writers('ellipsoids', [thermodynamic_properties], shape_source=alj,
+                             log_every=10, config_every=1000):
+    sim.operations.writers.append(writer)
 
 sim.run(1e5)
\ No newline at end of file
@@ -0,0 +1,59 @@
+import numpy as np
+
+import hoomd
+
+
+# sites of the cubic unit cell in units of the cell length
+lattice_basis = {
+    'sc': [[0, 0, 0]],
+    'bcc': [[0, 0, 0], [0.5, 0.5, 0.5]],
+    'fcc': [[0, 0, 0], [0, 0.5, 0.5], [0.5, 0, 0.5], [0.5, 0.5, 0]],
+}
+
+
+def lattice_positions(N, spacing, kind='sc'):
+    """
+    First N sites of the smallest cubic block of K^3 unit cells of the given
+    lattice kind that holds N particles, centered in a box of length
+    L = K*spacing. Returns an (N, 3) float64 array and L.
+    """
+    basis = np.asarray(lattice_basis[kind], dtype=np.float64)
+
+    # integer cube root, N**(1/3) alone can round up past an exact cube
+    K = max(1, int(round((N/len(basis))**(1/3))))
+    while K**3*len(basis) < N:
+        K += 1
+    while K > 1 and (K-1)**3*len(basis) >= N:
+        K -= 1
+    L = K*spacing
+
+    cells = np.indices((K, K, K), dtype=np.float64).reshape(3, -1).T
+    positions = (cells[:, None, :] + basis).reshape(-1, 3)[:N]
+    positions *= spacing
+    positions -= L/2
+
+    return positions, L
+
+
+def lattice_snapshot(N, spacing, kind='sc', moment_inertia=(0, 0, 0), types=('A',),
+                     communicator=None):
+    """
+    hoomd.Snapshot of N particles of the first type on a lattice, with unit
+    orientations and the same moment of inertia for every particle. Pass it
+    to Simulation.create_state_from_snapshot, no file is written. The arrays
+    are filled in place on rank 0 only, as hoomd expects.
+    """
+    snapshot = hoomd.Snapshot(communicator)
+
+    if snapshot.communicator.rank == 0:
+        positions, L = lattice_positions(N, spacing, kind)
+
+        snapshot.configuration.box = [L, L, L, 0, 0, 0]
+        snapshot.particles.types = list(types)
+        snapshot.particles.N = N
+        snapshot.particles.position[:] = positions
+        snapshot.particles.typeid[:] = 0
+        snapshot.particles.orientation[:] = (1, 0, 0, 0)
+        snapshot.particles.moment_inertia[:] = moment_inertia
+
+    return snapshot
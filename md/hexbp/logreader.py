@@ -0,0 +1,70 @@
+import os
+import json
+import fnmatch
+import hashlib
+
+import numpy as np
+import gsd.fl
+
+
+def _columns(f, names, frames):
+
+    columns = {}
+    for name in names:
+        # gsd.hoomd falls back to frame 0 for chunks missing in a frame
+        default = f.read_chunk(frame=0, name=name) if f.chunk_exists(frame=0, name=name) else None
+        values = []
+        for i in frames:
+            if f.chunk_exists(frame=i, name=name):
+                values.append(f.read_chunk(frame=i, name=name))
+            else:
+                values.append(default)
+        column = np.array(values)
+        # scalars are stored as arrays of length 1
+        if column.ndim == 2 and column.shape[1] == 1:
+            column = column[:, 0]
+        columns[name] = column
+    return columns
+
+
+def read_log(filename, keys, frames=slice(None), cache=True):
+    """
+    Columns of logged quantities of a gsd trajectory, one numpy array per
+    key with one row per frame. Only the requested chunks are read, particle
+    data is never decoded.
+
+    keys are log names as in frame.log, e.g. 'Simulation/walltime', or
+    patterns such as 'md/compute/ThermodynamicQuantities/*'. Chunks outside
+    the log, e.g. 'configuration/step' or 'configuration/box', can be asked
+    for by their full name. frames is a slice of the frames to read.
+
+    With cache=True the columns are stored in an .npz file next to the
+    trajectory, named after the keys and frames and checked against the
+    size and modification time of the trajectory, so repeated reads load
+    directly from it.
+    """
+    frames = frames if isinstance(frames, slice) else slice(*frames)
+    stat = os.stat(filename)
+    signature = json.dumps([list(keys), [frames.start, frames.stop, frames.step],
+                            stat.st_size, stat.st_mtime_ns])
+    digest = hashlib.sha1(signature.encode()).hexdigest()[:16]
+    head, tail = os.path.split(filename)
+    cache_file = os.path.join(head, f'.{tail}.{digest}.npz')
+
+    if cache and os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            return {name: data[name] for name in data.files}
+
+    with gsd.fl.open(name=filename, mode='r') as f:
+        available = f.find_matching_chunk_names('')
+        names = []
+        for key in keys:
+            full = key if key.startswith('configuration/') or key.startswith('particles/') else 'log/'+key
+            names += [n for n in available if fnmatch.fnmatchcase(n, full) and n not in names]
+        columns = _columns(f, names, range(f.nframes)[frames])
+
+    columns = {(name[4:] if name.startswith('log/') else name): column
+               for name, column in columns.items()}
+    if cache:
+        np.savez(cache_file, **columns)
+    return columns
@@ -0,0 +1,79 @@
+import os
+import sys
+import multiprocessing
+
+import numpy as np
+import freud
+import gsd.hoomd
+
+# Q6 and nematic order are the collective variables of hpmc/lj_metad
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'hpmc', 'lj_metad'))
+from colvars import make_cv
+
+
+def _analyze_frames(filename, frames, num_neighbors, u, rdf_bins, rdf_r_max):
+    """
+    Q6, nematic order and RDF pair counts of the given frames. The
+    collective variables and the freud RDF are created once and reused for
+    every frame.
+    """
+    steinhardt = make_cv('q6', num_neighbors=num_neighbors)
+    nematic_order = make_cv('nematic', u=u)
+    rdf = freud.density.RDF(bins=rdf_bins, r_max=rdf_r_max)
+
+    q6 = np.zeros(len(frames))
+    nematic = np.zeros(len(frames))
+    counts = np.zeros(rdf_bins)
+    # sum over frames of N^2/V, the ideal gas pair density as normalized by freud
+    norm = 0.
+
+    with gsd.hoomd.open(filename) as traj:
+        for k, i in enumerate(frames):
+            frame = traj[int(i)]
+            box = freud.box.Box.from_box(frame.configuration.box)
+            points = frame.particles.position
+
+            q6[k] = steinhardt(box, points)
+            nematic[k] = nematic_order(box, points, frame.particles.orientation)
+
+            rdf.compute((box, points))
+            counts += rdf.bin_counts
+            norm += len(points)**2/box.volume
+
+    return q6, nematic, counts, norm
+
+
+def analyze(filename, frames=slice(None), processes=None, chunks_per_process=4,
+            num_neighbors=6, u=(0, 0, 1), rdf_bins=30, rdf_r_max=2.2, context=None):
+    """
+    Structural analysis of a gsd trajectory split into chunks of frames over
+    a process pool. Every worker reads its own frames from the file.
+
+    Returns per-frame Q6 (averaged Steinhardt over num_neighbors nearest
+    neighbors, as in the analysis notebooks) and nematic order of the axis
+    u, and the RDF accumulated over all frames as (bin centers, g(r)). g(r)
+    is the total pair count over the total ideal gas count, normalized as in
+    freud.density.RDF, so frames with different boxes (NPT) are weighted
+    correctly.
+    """
+    with gsd.hoomd.open(filename) as traj:
+        indices = np.arange(len(traj))[frames]
+
+    ctx = multiprocessing.get_context(context)
+    n_chunks = max(1, min(len(indices), (processes or ctx.cpu_count())*chunks_per_process))
+    tasks = [(filename, chunk, num_neighbors, u, rdf_bins, rdf_r_max)
+             for chunk in np.array_split(indices, n_chunks)]
+
+    with ctx.Pool(processes) as pool:
+        results = pool.starmap(_analyze_frames, tasks)
+
+    q6 = np.concatenate([r[0] for r in results])
+    nematic = np.concatenate([r[1] for r in results])
+    counts = np.sum([r[2] for r in results], axis=0)
+    norm = np.sum([r[3] for r in results])
+
+    edges = np.linspace(0, rdf_r_max, rdf_bins+1)
+    shell = 4*np.pi/3*(edges[1:]**3-edges[:-1]**3)
+    centers = 0.5*(edges[1:]+edges[:-1])
+
+    return q6, nematic, (centers, counts/(norm*shell))
@@ -0,0 +1,139 @@
+import numpy as np
+
+import hoomd
+
+
+class BlockSeries:
+    """
+    Streaming block averages of one quantity. Samples are summed into blocks
+    of block_size and only the block means are kept. When there are more
+    than max_blocks, adjacent blocks are merged pairwise and the block size
+    doubles, so memory stays bounded however long the run is.
+    """
+    def __init__(self, block_size=10, max_blocks=200):
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.blocks = []
+        self.n_samples = 0
+        self._sum = 0.
+        self._count = 0
+
+    def add(self, value):
+
+        self._sum += value
+        self._count += 1
+        self.n_samples += 1
+        if self._count == self.block_size:
+            self.blocks.append(self._sum/self._count)
+            self._sum = 0.
+            self._count = 0
+            if len(self.blocks) > self.max_blocks:
+                self.coarsen()
+
+    def coarsen(self):
+
+        n = len(self.blocks)//2*2
+        merged = 0.5*(np.asarray(self.blocks[0:n:2])+np.asarray(self.blocks[1:n:2]))
+        self.blocks = list(merged) + self.blocks[n:]
+        self.block_size *= 2
+
+    @staticmethod
+    def autocorrelation(blocks):
+        """
+        Lag-1 autocorrelation of a sequence of block means
+        """
+        b = np.asarray(blocks)-np.mean(blocks)
+        var = np.dot(b, b)
+        return np.dot(b[:-1], b[1:])/var if var > 0 else 0.
+
+    def drift(self, window, max_corr=0.5):
+        """
+        Difference of the means of the last two windows of window blocks, its
+        standard error and the mean of the last window, or None if there are
+        not enough blocks yet. The error is inflated by (1+rho)/(1-rho) for
+        the lag-1 autocorrelation rho of the block means within the windows,
+        capped at max_corr so a trend inside a window cannot hide a drift.
+        """
+        if len(self.blocks) < 2*window:
+            return None
+
+        a = np.asarray(self.blocks[-2*window:-window])
+        b = np.asarray(self.blocks[-window:])
+        rho = 0.5*(self.autocorrelation(a)+self.autocorrelation(b))
+        rho = min(max(rho, 0.), max_corr)
+
+        error = np.sqrt((np.var(a, ddof=1)+np.var(b, ddof=1))/window*(1+rho)/(1-rho))
+        return abs(np.mean(b)-np.mean(a)), error, np.mean(b)
+
+
+class EquilibrationDetector(hoomd.custom.Action):
+    """
+    Custom writer that samples quantities every time it is triggered and
+    reports when all of them are stationary: the means of the last two
+    windows of block averages (see BlockSeries.drift) agree within n_sigma
+    standard errors, or within rtol of the mean when rtol is given. Blocks
+    should be longer than the autocorrelation time of the quantities, the
+    error correction for correlated blocks is deliberately limited.
+
+    quantities maps names to callables returning a float, or to (object,
+    attribute) pairs of loggable quantities, e.g.
+    {'pressure': (thermo, 'pressure'), 'potential_energy': (thermo, 'potential_energy')}.
+
+    HOOMD offers no way to stop sim.run from inside an action, so run in
+    chunks until equilibrated is True, see run_until_equilibrated.
+    """
+    def __init__(self, quantities, block_size=10, window=10, n_sigma=2.0, rtol=None,
+                 max_corr=0.5, max_blocks=200):
+        self.quantities = {name: self._getter(q) for name, q in quantities.items()}
+        self.window = window
+        self.n_sigma = n_sigma
+        self.rtol = rtol
+        self.max_corr = max_corr
+        self.series = {name: BlockSeries(block_size, max(max_blocks, 4*window))
+                       for name in quantities}
+        self.stationary = {name: False for name in quantities}
+        self.equilibrated = False
+        self.equilibrated_step = None
+
+    @staticmethod
+    def _getter(quantity):
+
+        if callable(quantity):
+            return quantity
+        obj, attr = quantity
+        return lambda: getattr(obj, attr)
+
+    def act(self, timestep):
+
+        for name, get in self.quantities.items():
+            series = self.series[name]
+            series.add(float(get()))
+            result = series.drift(self.window, self.max_corr)
+            if result is None:
+                self.stationary[name] = False
+                continue
+            drift, error, mean = result
+            tolerance = self.n_sigma*error
+            if self.rtol is not None:
+                tolerance = max(tolerance, self.rtol*abs(mean))
+            self.stationary[name] = drift <= tolerance
+
+        self.equilibrated = all(self.stationary.values())
+        if self.equilibrated and self.equilibrated_step is None:
+            self.equilibrated_step = timestep
+
+    @hoomd.logging.log(category='scalar', requires_run=True)
+    def is_equilibrated(self):
+        return float(self.equilibrated)
+
+
+def run_until_equilibrated(sim, detector, check_every, max_steps):
+    """
+    Run sim in chunks of check_every steps until the detector (attached as a
+    writer) reports equilibrium or max_steps more steps have been run.
+    Returns whether equilibrium was reached.
+    """
+    start = sim.timestep
+    while not detector.equilibrated and sim.timestep-start < max_steps:
+        sim.run(min(check_every, max_steps-(sim.timestep-start)))
+    return detector.equilibrated
@@ -0,0 +1,165 @@
+import numpy as np
+
+import hoomd
+import gsd.hoomd
+import coxeter
+
+from sweep import Stage, Sweep
+from equilibration import EquilibrationDetector, run_until_equilibrated
+
+
+def read_particle(filename):
+    """
+    Shape of the first type in the last frame of filename
+    """
+    with gsd.hoomd.open(filename) as traj:
+        frame = traj[-1]
+    verts = frame.particles.type_shapes[0]['vertices']
+    return np.asarray(verts), coxeter.shapes.ConvexPolyhedron(verts), frame
+
+
+def alj_simulation(input, method, output, seed, dt=0.0005, write_every=1000):
+    """
+    MD simulation of ALJ polyhedra read from input with one integration
+    method, writing thermodynamic quantities and shapes to output. Returns
+    the simulation, the writer and the thermodynamic quantities compute.
+    """
+    verts, particle, _ = read_particle(input)
+    faces = particle.faces
+    sigma = 2*particle.insphere_from_center.radius
+
+    cpu = hoomd.device.CPU()
+    sim = hoomd.Simulation(device=cpu, seed=seed)
+    sim.create_state_from_gsd(filename=input, frame=-1)
+
+    nl = hoomd.md.nlist.Cell(buffer=0.4)
+
+    alj = hoomd.md.pair.aniso.ALJ(nl)
+    alj.r_cut[('A', 'A')] = 2*particle.circumsphere_from_center.radius + 0.15*sigma
+    alj.params[('A', 'A')] = dict(epsilon=0.1,
+                                  sigma_i=sigma,
+                                  sigma_j=sigma,
+                                  alpha=0)
+    alj.shape['A'] = dict(vertices=verts,
+                          faces=faces,
+                          rounding_radii=0)
+
+    integrator = hoomd.md.Integrator(dt=dt,
+                                     methods=[method],
+                                     forces=[alj],
+                                     integrate_rotational_dof=True)
+
+    thermodynamic_properties = hoomd.md.compute.ThermodynamicQuantities(filter=hoomd.filter.All())
+    logger = hoomd.logging.Logger()
+    logger.add(sim, quantities=['timestep', 'walltime'])
+    logger.add(alj, quantities=['type_shapes'])
+    logger.add(thermodynamic_properties)
+
+    gsd_writer = hoomd.write.GSD(filename=output,
+                                 trigger=hoomd.trigger.Periodic(write_every),
+                                 log=logger,
+                                 mode='wb')
+
+    sim.operations.writers.append(gsd_writer)
+    sim.operations.integrator = integrator
+    sim.operations.computes.append(thermodynamic_properties)
+
+    return sim, gsd_writer, thermodynamic_properties
+
+
+def anneal(output, input, kT_init=1.0, kT_second=2.0, t_duration=20000, seed=20, dt=0.0005):
+    """
+    NVT cycles between kT_init and kT_second, as in anneal.ipynb
+    """
+    tau = 100*dt
+    # the step count of the input, so the temperature cycle starts now
+    _, _, frame = read_particle(input)
+    kT = hoomd.variant.Cycle(A=kT_init,
+                             B=kT_second,
+                             t_start=frame.configuration.step,
+                             t_A=t_duration,
+                             t_AB=t_duration,
+                             t_B=t_duration,
+                             t_BA=t_duration)
+    nvt = hoomd.md.methods.NVT(filter=hoomd.filter.All(), kT=kT, tau=tau)
+
+    sim, gsd_writer, _ = alj_simulation(input, nvt, output, seed, dt)
+    sim.state.thermalize_particle_momenta(filter=hoomd.filter.All(), kT=kT_init)
+    sim.run(t_duration*5)
+
+    # removing the writer closes the file
+    sim.operations.writers.remove(gsd_writer)
+
+
+def compress(output, input, pressure_factor=12, t_ramp=10000, kT=1.0, seed=20, dt=0.0005):
+    """
+    NPT ramp from the last pressure of input to pressure_factor*kT/V_particle,
+    as in compress.ipynb
+    """
+    _, particle, frame = read_particle(input)
+    p_init = frame.log['md/compute/ThermodynamicQuantities/pressure'][0]
+    p_second = pressure_factor*kT/particle.volume
+
+    S = hoomd.variant.Power(A=p_init,
+                            B=p_second,
+                            power=5,
+                            t_start=frame.configuration.step,
+                            t_ramp=t_ramp)
+    npt = hoomd.md.methods.NPT(filter=hoomd.filter.All(),
+                               kT=kT,
+                               tau=100*dt,
+                               S=S,
+                               tauS=1000*dt,
+                               couple='xyz')
+
+    sim, gsd_writer, _ = alj_simulation(input, npt, output, seed, dt)
+    sim.run(t_ramp)
+    sim.operations.writers.remove(gsd_writer)
+
+
+def npt(output, input, pressure_factor=12, steps=100000, kT=1.0, seed=20, dt=0.0005,
+        check_every=None):
+    """
+    NPT at pressure_factor*kT/V_particle, as in equilibriate_at_npt.ipynb.
+
+    With check_every, pressure, potential energy and volume are sampled
+    every 100 steps and the run stops once they are stationary (see
+    EquilibrationDetector), checked every check_every steps, or after steps.
+    """
+    _, particle, _ = read_particle(input)
+    npt = hoomd.md.methods.NPT(filter=hoomd.filter.All(),
+                               kT=kT,
+                               tau=100*dt,
+                               S=pressure_factor*kT/particle.volume,
+                               tauS=1000*dt,
+                               couple='xyz')
+
+    sim, gsd_writer, thermo = alj_simulation(input, npt, output, seed, dt)
+    if check_every is None:
+        sim.run(steps)
+    else:
+        detector = EquilibrationDetector({name: (thermo, name) for name in
+                                          ('pressure', 'potential_energy', 'volume')})
+        sim.operations.writers.append(hoomd.write.CustomWriter(action=detector,
+                                                               trigger=hoomd.trigger.Periodic(100)))
+        run_until_equilibrated(sim, detector, check_every, steps)
+    sim.operations.writers.remove(gsd_writer)
+
+
+def make_sweep(source='./DATA/lattice.gsd', cache_dir='./DATA/sweep', processes=None):
+    """
+    anneal -> compress -> NPT chain starting from the lattice of init.ipynb.
+    Grid points take kT_second, pressure_factor and seed, e.g.
+
+        make_sweep().run({'kT_second': [2.0], 'pressure_factor': [12, 14, 16], 'seed': [20]})
+
+    runs the anneal once and the compress and NPT stages once per pressure.
+    """
+    stages = [Stage('anneal', anneal, ('kT_second', 'seed')),
+              Stage('compress', compress, ('pressure_factor', 'seed')),
+              Stage('npt', npt, ('pressure_factor', 'seed'))]
+    return Sweep(stages, cache_dir, source=source, processes=processes)
+
+
+if __name__ == '__main__':
+    make_sweep().run({'kT_second': [2.0], 'pressure_factor': [12], 'seed': [20]})